@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional
+
+from market import get_market_store
+from market_history import get_market_history
+from retrieval import get_index
+from shared_store import SharedStore, worker_shared_store
+
+# Profile fields that change which schemes apply or what prices are relevant
+PROFILE_FACETS = ["state", "district", "occupation", "gender", "age", "caste", "annual_income", "land_holding"]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, NFC, punctuation stripped and whitespace collapsed."""
+    text = unicodedata.normalize("NFC", question).lower()
+    # Keep combining marks (\w misses some Indic vowel signs), drop punctuation
+    text = "".join(ch if ch.isalnum() or unicodedata.category(ch).startswith("M") else " " for ch in text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def profile_facets(user_profile: Optional[dict]) -> Dict[str, str]:
+    if not isinstance(user_profile, dict):
+        return {}
+    facets = {}
+    for field in PROFILE_FACETS:
+        value = user_profile.get(field)
+        if value not in (None, ""):
+            facets[field] = str(value).strip().lower()
+    return facets
+
+
+def corpus_version() -> str:
+    """Version of the scheme corpus, market data and price trends that answers are derived from."""
+    signature = get_market_store().signature
+    history = get_market_history()
+    # as_of alone misses a day's partition being re-ingested; the aggregates file signature does not
+    trends = f"{history.as_of}@{history.signature[0]}" if history.signature else str(history.as_of)
+    return f"{get_index().fingerprint[:16]}:{signature[0]}:{signature[1]}:{trends}"
+
+
+class _Entry:
+    __slots__ = ("answer", "expires_at", "bucket", "tokens")
+
+    def __init__(self, answer: str, expires_at: float, bucket: str, tokens: FrozenSet[str]):
+        self.answer = answer
+        self.expires_at = expires_at
+        self.bucket = bucket
+        self.tokens = tokens
+
+
+class AnswerCache:
+    """
+    LLM answer cache keyed by normalized question, profile facets and corpus version.
+
+    Args:
+        max_entries (int): Least recently used answers are evicted past this
+        ttl_seconds (float): Answers older than this are treated as missing
+        similarity_threshold (float): If set, a question whose word set has at
+            least this Jaccard similarity to a cached one (same facets and
+            corpus version) reuses its answer
+        store (SharedStore): If set, answers are also written there and looked
+            up there on a local miss, so worker processes share them;
+            near-duplicate matching covers only the local entries
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 24 * 3600,
+                 similarity_threshold: Optional[float] = None, store: Optional[SharedStore] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.store = store
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(facets: Dict[str, str], version: str, scope: str) -> str:
+        return f"{scope}|{version}|{json.dumps(facets, sort_keys=True)}"
+
+    @staticmethod
+    def _key(normalized: str, bucket: str) -> str:
+        return hashlib.sha256(f"{bucket}|{normalized}".encode("utf-8")).hexdigest()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._buckets.get(entry.bucket)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[entry.bucket]
+
+    def get(self, question: str, user_profile: Optional[dict] = None, version: str = "",
+            scope: str = "") -> Optional[str]:
+        """
+        Return the cached answer, or None.
+
+        Args:
+            question (str): The question as asked
+            user_profile (dict): Only PROFILE_FACETS fields take part in the key
+            version (str): Corpus version the answer must have been built from
+            scope (str): Separates answers produced by different prompts
+        """
+        normalized = normalize_question(question)
+        bucket = self._bucket(profile_facets(user_profile), version, scope)
+        key = self._key(normalized, bucket)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+        if self.store is not None:
+            # Outside the lock: this may be a network round-trip
+            shared = self.store.get(f"answer:{key}")
+            if shared is not None:
+                answer = shared.decode("utf-8")
+                with self._lock:
+                    self._insert(key, _Entry(answer, now + self.ttl_seconds, bucket, frozenset(normalized.split())))
+                    self.hits += 1
+                return answer
+        with self._lock:
+            if self.similarity_threshold is not None:
+                answer = self._near_duplicate(normalized, bucket, now)
+                if answer is not None:
+                    self.near_hits += 1
+                    return answer
+            self.misses += 1
+            return None
+
+    def _near_duplicate(self, normalized: str, bucket: str, now: float) -> Optional[str]:
+        tokens = frozenset(normalized.split())
+        if not tokens:
+            return None
+        best_key, best_score = None, self.similarity_threshold
+        for key in self._buckets.get(bucket, ()):
+            entry = self._entries[key]
+            if entry.expires_at < now:
+                continue
+            score = len(tokens & entry.tokens) / len(tokens | entry.tokens)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key].answer
+
+    def put(self, question: str, answer: str, user_profile: Optional[dict] = None, version: str = "",
+            scope: str = ""):
+        normalized = normalize_question(question)
+        bucket = self._bucket(profile_facets(user_profile), version, scope)
+        key = self._key(normalized, bucket)
+        entry = _Entry(answer, time.monotonic() + self.ttl_seconds, bucket, frozenset(normalized.split()))
+        with self._lock:
+            self._insert(key, entry)
+        if self.store is not None:
+            self.store.set(f"answer:{key}", answer.encode("utf-8"), self.ttl_seconds)
+
+    def _insert(self, key: str, entry: _Entry):
+        self._remove(key)
+        self._entries[key] = entry
+        self._buckets.setdefault(entry.bucket, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """
+    Return the process-wide answer cache.
+
+    Configured by ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS and
+    ANSWER_CACHE_SIMILARITY (unset disables near-duplicate matching).
+    With a shared SHARED_STORE_URL, answers are shared between workers.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                similarity = os.getenv("ANSWER_CACHE_SIMILARITY")
+                _cache = AnswerCache(
+                    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "5000")),
+                    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600))),
+                    similarity_threshold=float(similarity) if similarity else None,
+                    store=worker_shared_store(),
+                )
+    return _cache
@@ -0,0 +1,129 @@
+import logging
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = os.getenv("FFMPEG_BINARY", "ffmpeg")
+# Longest a single transcode may take before the original audio is used instead
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT_SECONDS", "15"))
+
+# What speech-to-text gets: 16 kHz mono, leading and trailing silence trimmed
+STT_SAMPLE_RATE = 16000
+STT_BITRATE = os.getenv("STT_AUDIO_BITRATE", "24k")
+SILENCE_THRESHOLD = os.getenv("SILENCE_THRESHOLD", "-40dB")
+# Silence kept at each end, so the first and last words are not clipped
+SILENCE_PADDING = "0.2"
+
+# Reply formats: name -> (media type, ffmpeg output arguments)
+REPLY_FORMATS = {
+    "opus": ("audio/ogg", ["-ac", "1", "-c:a", "libopus", "-b:a", os.getenv("REPLY_OPUS_BITRATE", "16k"),
+                           "-application", "voip", "-f", "ogg"]),
+    "mp3": ("audio/mpeg", ["-ac", "1", "-ar", "22050", "-c:a", "libmp3lame",
+                           "-b:a", os.getenv("REPLY_MP3_BITRATE", "24k"),
+                           # No tags or header frame, so per-sentence clips can be streamed back to back
+                           "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3"]),
+}
+
+
+class TranscodeError(Exception):
+    """ffmpeg could not convert the audio."""
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_available() -> bool:
+    available = shutil.which(FFMPEG) is not None
+    if not available:
+        logger.warning("ffmpeg not found; audio is passed through without transcoding")
+    return available
+
+
+def transcode(audio: bytes, output_args: List[str], filters: Optional[str] = None) -> bytes:
+    """Pipe audio through ffmpeg with the given output arguments and return the result."""
+    command = [FFMPEG, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn"]
+    if filters:
+        command += ["-af", filters]
+    command += output_args + ["pipe:1"]
+    try:
+        result = subprocess.run(command, input=audio, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise TranscodeError(str(e)) from e
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited {result.returncode}")
+    return result.stdout
+
+
+def _trim_filter() -> str:
+    # silenceremove only trims the start, so the clip is reversed to trim the end too
+    trim = (f"silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD}"
+            f":start_silence={SILENCE_PADDING}")
+    return f"{trim},areverse,{trim},areverse"
+
+
+def normalize_for_stt(audio: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """
+    Downmix to 16 kHz mono, trim silence at both ends and encode as speech Opus.
+
+    Voice notes arrive as 44.1/48 kHz stereo MP3 or OGG with silence around
+    the question; the result is a fraction of the size and of the audio
+    length speech-to-text has to process.
+
+    Returns:
+        Tuple[bytes, str]: The audio and its MIME type; the original upload if
+            ffmpeg is missing or fails, or if nothing but silence is left
+    """
+    if not audio or not ffmpeg_available():
+        return audio, mime_type
+    try:
+        normalized = transcode(
+            audio,
+            ["-ac", "1", "-ar", str(STT_SAMPLE_RATE), "-c:a", "libopus", "-b:a", STT_BITRATE,
+             "-application", "voip", "-f", "ogg"],
+            filters=_trim_filter(),
+        )
+    except TranscodeError as e:
+        logger.warning("Could not normalize %s upload: %s", mime_type, e)
+        return audio, mime_type
+    if not normalized:
+        return audio, mime_type
+    return normalized, "audio/ogg"
+
+
+def choose_reply_format(requested: Optional[str] = None, accept: Optional[str] = None) -> Optional[str]:
+    """
+    Pick the reply encoding: an explicit request wins, else the client's Accept header.
+
+    Returns:
+        str: A REPLY_FORMATS key, or None to send gTTS's MP3 unchanged
+    """
+    requested = (requested or "").strip().lower()
+    if requested in REPLY_FORMATS:
+        return requested
+    if requested == "original":
+        return None
+    accept = (accept or "").lower()
+    if "audio/ogg" in accept or "audio/opus" in accept:
+        return "opus"
+    # Every client that plays the current replies plays MP3
+    return "mp3"
+
+
+def encode_reply(mp3: bytes, reply_format: Optional[str]) -> Tuple[bytes, str]:
+    """
+    Re-encode a gTTS MP3 reply for the chosen format.
+
+    Returns:
+        Tuple[bytes, str]: The audio and its media type; the MP3 unchanged
+            when no format is chosen or transcoding fails
+    """
+    if reply_format not in REPLY_FORMATS or not mp3 or not ffmpeg_available():
+        return mp3, "audio/mpeg"
+    media_type, output_args = REPLY_FORMATS[reply_format]
+    try:
+        return transcode(mp3, output_args), media_type
+    except TranscodeError as e:
+        logger.warning("Could not encode reply as %s: %s", reply_format, e)
+        return mp3, "audio/mpeg"
@@ -0,0 +1,394 @@
+"""
+Answer many (question, profile) pairs at once, and precompute FAQ answers.
+
+    python batch.py run questions.jsonl -o answers.jsonl --concurrency 8
+    python batch.py faq --faq faq.json --states kerala karnataka
+
+Input lines are JSON objects with "question" and optionally "id" and
+"profile". Items are grouped by the profile's state so each state's corpus
+prefix is registered with the model once and shared by all its questions.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from answer_cache import corpus_version, get_answer_cache, normalize_question, profile_facets
+from context_cache import ContextCache
+from eligibility import MIN_CONFIRMED_SCHEMES, eligible_schemes, format_eligible, is_eligibility_question
+from gemini_client import MODEL_NAME, call_gemini, get_client
+from language import detect_language, normalize_language
+from market import market_context
+from market_history import trend_context
+from retrieval import get_index, normalize_state, retrieve_context
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+FAQ_PATH = BASE_DIR / "faq.json"
+# Precomputed FAQ answers, served from their own map (FAQAnswers) rather than the answer cache
+FAQ_ANSWERS_PATH = BASE_DIR / ".cache" / "faq_answers.jsonl"
+# Answer cache scope used while generating FAQ answers; they depend only on state and question
+FAQ_SCOPE = "faq"
+
+SYSTEM_PROMPT = """You are a helpful assistant that provides information about various government schemes, market prices and digital literacy from different states in India.
+    Use the context and your knowledge to answer questions about these schemes. Provide a very clean output without any special characters. Answer in the language of the question. Give relevant information according to the user profile when one is given.
+    """
+
+
+_context_cache: Optional[ContextCache] = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache() -> ContextCache:
+    """Return the process-wide cache of registered corpus prefixes, shared by every batch run."""
+    global _context_cache
+    if _context_cache is None:
+        with _context_cache_lock:
+            if _context_cache is None:
+                _context_cache = ContextCache(
+                    get_client(), SYSTEM_PROMPT, ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+                )
+    return _context_cache
+
+
+def load_items(lines: Iterable[str]) -> List[Dict]:
+    """Parse JSONL batch input; blank lines are skipped and items without an id get their line number."""
+    items = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if not isinstance(item, dict) or not item.get("question"):
+            raise ValueError(f"line {number}: expected an object with a \"question\"")
+        item.setdefault("id", number)
+        if not isinstance(item.get("profile"), dict):
+            item["profile"] = {}
+        items.append(item)
+    return items
+
+
+def _dedupe_key(item: Dict) -> str:
+    return json.dumps([normalize_question(item["question"]), profile_facets(item["profile"])], sort_keys=True)
+
+
+def group_by_state(items: Iterable[Dict]) -> "OrderedDict[str, List[Dict]]":
+    """Items keyed by their profile's state, in order of first appearance; "" holds items with no state."""
+    groups: "OrderedDict[str, List[Dict]]" = OrderedDict()
+    for item in items:
+        groups.setdefault(normalize_state(item["profile"].get("state")), []).append(item)
+    return groups
+
+
+class BatchRunner:
+    """
+    Answers batch items statelessly, with bounded parallelism.
+
+    Each item is answered by the eligibility rules, the answer cache, or one
+    model call on top of its state's cached corpus prefix (falling back to
+    retrieved context when caching is unavailable).
+
+    Args:
+        concurrency (int): Items answered at the same time
+        client: google.genai Client; the shared one by default
+        scope (str): Answer cache scope the answers are stored under
+    """
+
+    def __init__(self, concurrency: int = 8, client=None, scope: str = "batch"):
+        self.concurrency = concurrency
+        self.client = client or get_client()
+        self.scope = scope
+        # A run reuses the prefixes earlier runs registered; only another client needs its own
+        self.context_cache = get_context_cache() if client is None else ContextCache(
+            self.client, SYSTEM_PROMPT, ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+        )
+
+    def _generate(self, question: str, profile: Dict, state: Optional[str]) -> str:
+        facts = {k: v for k, v in profile.items() if v not in (None, "")}
+        prompt = f"User profile: {json.dumps(facts, ensure_ascii=False)}\n\nQuestion: {question}" if facts else question
+        # Trends change daily, so they go with the question rather than in the cached prefix
+        trends = trend_context(question, profile)
+        if trends:
+            prompt = f"Price trends:\n{trends}\n\n{prompt}"
+        answer = self.context_cache.ask(prompt, state)
+        if answer is not None:
+            return answer
+        context = retrieve_context(question, state=state, user_profile=profile or None)
+        market = market_context(question, profile)
+        response = call_gemini(
+            self.client.models.generate_content,
+            model=MODEL_NAME,
+            contents=f"{SYSTEM_PROMPT}\nContext:\n{context}\nMarket prices:\n{market}\n\n{prompt}",
+        )
+        return response.text
+
+    def answer(self, item: Dict, version: Optional[str] = None) -> Dict:
+        """Answer one item; errors are reported in the result rather than raised."""
+        question, profile = item["question"], item.get("profile") or {}
+        state = profile.get("state") or None
+        version = version or corpus_version()
+        result = {"id": item.get("id"), "state": normalize_state(state) or None, "question": question}
+        started = time.perf_counter()
+        try:
+            schemes = []
+            if profile and is_eligibility_question(question) and detect_language(question) == "en":
+                schemes = eligible_schemes(get_index(), profile)
+            if len(schemes) >= MIN_CONFIRMED_SCHEMES:
+                result["answer"], result["source"] = format_eligible(schemes), "rules"
+            else:
+                cached = get_answer_cache().get(question, profile, version, scope=self.scope)
+                if cached is not None:
+                    result["answer"], result["source"] = cached, "cache"
+                else:
+                    answer = self._generate(question, profile, state)
+                    get_answer_cache().put(question, answer, profile, version, scope=self.scope)
+                    result["answer"], result["source"] = answer, "llm"
+        except Exception as e:
+            logger.warning("Batch item %s failed: %s", item.get("id"), e)
+            result["error"] = str(e)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def iter_results(self, items: Iterable[Dict], version: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Yield one result per item, state group by state group, in input order within a group.
+
+        Items repeating an earlier question with the same profile facets are
+        answered once; running at the same time, they would all miss the cache.
+        Every item is answered against one corpus version, current at the start
+        unless given.
+        """
+        version = version or corpus_version()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            for state, group in group_by_state(items).items():
+                unique: "OrderedDict[str, Dict]" = OrderedDict()
+                for item in group:
+                    unique.setdefault(_dedupe_key(item), item)
+                logger.info("Answering %d questions (%d distinct) for %s", len(group), len(unique),
+                            state or "all states")
+                pending = zip(unique, executor.map(lambda item: self.answer(item, version), unique.values()))
+                done: Dict[str, Dict] = {}
+                for item in group:
+                    key = _dedupe_key(item)
+                    while key not in done:
+                        answered_key, result = next(pending)
+                        done[answered_key] = result
+                    result = done[key]
+                    if unique[key] is not item:
+                        result = dict(result, id=item.get("id"), question=item["question"],
+                                      source="duplicate", seconds=0.0)
+                    yield result
+
+    def run(self, items: Iterable[Dict], out) -> Dict:
+        """Write results to out as JSONL as they complete and return a summary."""
+        summary = {"items": 0, "errors": 0, "sources": {}}
+        started = time.perf_counter()
+        for result in self.iter_results(items):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            summary["items"] += 1
+            if "error" in result:
+                summary["errors"] += 1
+            else:
+                summary["sources"][result["source"]] = summary["sources"].get(result["source"], 0) + 1
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return summary
+
+
+def faq_items(faq: Dict, states: Optional[List[str]] = None,
+              languages: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Expand a curated FAQ into batch items, one per state, language and question.
+
+    The FAQ maps "default" and state keys to {language: [questions]}; a
+    state's own questions are asked in addition to the default ones.
+    """
+    kb = get_index()
+    states = [normalize_state(s) for s in states] if states else [s for s in kb.states if s != "central"]
+    languages = {normalize_language(language) for language in languages} if languages else None
+    items = []
+    for state in states:
+        for source in ("default", state):
+            for language, questions in faq.get(source, {}).items():
+                if languages and normalize_language(language) not in languages:
+                    continue
+                for question in questions:
+                    items.append({
+                        "id": f"{state}/{language}/{len(items) + 1}",
+                        "question": question,
+                        "profile": {"state": state},
+                        "language": language,
+                    })
+    return items
+
+
+def _read_faq_answers(path: Path) -> List[Dict]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_faq_answers(results: Iterable[Dict], version: str, path: Path = FAQ_ANSWERS_PATH) -> int:
+    """
+    Merge answered FAQ results into the answers file, replacing older answers to the same questions.
+
+    Args:
+        results: Results of a BatchRunner run
+        version (str): Corpus version the run answered against
+        path (Path): The answers file
+    """
+    records = OrderedDict(((r["state"], r["question"]), r) for r in _read_faq_answers(path))
+    written = 0
+    for result in results:
+        if "error" in result:
+            continue
+        records[(result["state"], result["question"])] = {
+            "state": result["state"], "question": result["question"], "answer": result["answer"],
+            "version": version,
+        }
+        written += 1
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    # Readers never see a half-written file
+    os.replace(tmp, path)
+    return written
+
+
+class FAQAnswers:
+    """
+    The precomputed FAQ answers for the current corpus, kept apart from the answer cache.
+
+    They never expire or get evicted by live traffic; the answers file is
+    re-read when it changes on disk or the corpus version changes.
+
+    Args:
+        path (Path): The answers file written by save_faq_answers
+    """
+
+    def __init__(self, path: Path = FAQ_ANSWERS_PATH):
+        self.path = path
+        self.signature = None
+        self.version = None
+        self._answers: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self, version: Optional[str] = None) -> int:
+        """(Re)read the answers built from this corpus version; returns how many there are."""
+        version = version or corpus_version()
+        with self._lock:
+            signature = self._file_signature()
+            answers = {}
+            for record in _read_faq_answers(self.path):
+                if record.get("version") == version:
+                    answers[(normalize_state(record["state"]), normalize_question(record["question"]))] = record["answer"]
+            self._answers, self.signature, self.version = answers, signature, version
+        return len(answers)
+
+    def get(self, question: str, state: Optional[str], version: str) -> Optional[str]:
+        if self._file_signature() != self.signature or version != self.version:
+            self.load(version)
+        return self._answers.get((normalize_state(state), normalize_question(question)))
+
+
+_faq_answers: Optional[FAQAnswers] = None
+_faq_lock = threading.Lock()
+
+
+def get_faq_answers() -> FAQAnswers:
+    """Return the process-wide FAQ answers."""
+    global _faq_answers
+    if _faq_answers is None:
+        with _faq_lock:
+            if _faq_answers is None:
+                _faq_answers = FAQAnswers()
+    return _faq_answers
+
+
+def load_faq_answers() -> int:
+    """Load the precomputed FAQ answers built from the current corpus."""
+    return get_faq_answers().load()
+
+
+def faq_answer(question: str, user_profile: Optional[dict], version: str) -> Optional[str]:
+    """The precomputed answer to a FAQ question for the user's state, if there is one."""
+    state = user_profile.get("state") if isinstance(user_profile, dict) else None
+    if not state:
+        return None
+    return get_faq_answers().get(question, state, version)
+
+
+def precompute_faq(faq_path: Path = FAQ_PATH, states: Optional[List[str]] = None,
+                   languages: Optional[List[str]] = None, concurrency: int = 8,
+                   out=None) -> Dict:
+    """Answer the curated FAQ for each state and language and store the answers."""
+    with open(faq_path, encoding="utf-8") as f:
+        faq = json.load(f)
+    items = faq_items(faq, states, languages)
+    runner = BatchRunner(concurrency=concurrency, scope=FAQ_SCOPE)
+    # Answers are stamped with the version they were generated from; if the corpus
+    # changes during the run they are stale and must not be served as current
+    version = corpus_version()
+    results = []
+    for result in runner.iter_results(items, version):
+        results.append(result)
+        if out is not None:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    written = save_faq_answers(results, version)
+    loaded = load_faq_answers()
+    return {"questions": len(items), "answered": written, "loaded": loaded,
+            "errors": sum(1 for r in results if "error" in r)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch scheme questions and FAQ precomputation.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Answer a JSONL file of questions")
+    run.add_argument("input", help="JSONL input, or - for stdin")
+    run.add_argument("-o", "--output", help="JSONL output (default: stdout)")
+    run.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8")))
+
+    faq = sub.add_parser("faq", help="Precompute answers to the curated FAQ")
+    faq.add_argument("--faq", default=str(FAQ_PATH), help="FAQ JSON file")
+    faq.add_argument("--states", nargs="*", help="States to answer for (default: all)")
+    faq.add_argument("--languages", nargs="*", help="Languages to answer in (default: all in the FAQ)")
+    faq.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.command == "run":
+        source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+        with source:
+            items = load_items(source)
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            summary = BatchRunner(concurrency=args.concurrency).run(items, out)
+        finally:
+            if args.output:
+                out.close()
+    else:
+        summary = precompute_faq(Path(args.faq), args.states, args.languages, args.concurrency)
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
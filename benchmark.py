@@ -0,0 +1,362 @@
+"""
+Offline benchmark for /chat and the MCP tools.
+
+Gemini and gTTS are replaced with local stand-ins that sleep for a
+configurable latency, so retrieval, prompt assembly, caching and the
+pipeline's own overhead are measured without network access:
+
+    python benchmark.py --requests 200 --concurrency 8 --mode two-call
+    python benchmark.py --target mcp --requests 100 --concurrency 16
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+AUDIO_DIR = BASE_DIR / "audio"
+
+# Recorded questions in audio/ with stand-in transcripts, plus text-only questions
+SAMPLE_QUERIES = [
+    {"clip": "WhatsApp Audio 2025-05-11 at 00.58.45.mp3",
+     "transcript": "प्रधानमंत्री किसान सम्मान निधि योजना में किसानों को हर साल कितनी मदद मिलती है?",
+     "profile": {"state": "Bihar", "occupation": "farmer", "gender": "male", "age": 45}},
+    {"clip": "kannada.mp3",
+     "transcript": "ರೈತರಿಗೆ ಕರ್ನಾಟಕದಲ್ಲಿ ಯಾವ ಸರ್ಕಾರಿ ಯೋಜನೆಗಳು ಲಭ್ಯವಿವೆ?",
+     "profile": {"state": "Karnataka", "occupation": "farmer", "land_holding": "2 acres"}},
+    {"clip": "marathi.mp3",
+     "transcript": "शेतकऱ्यांसाठी कोणत्या सरकारी योजना आहेत आणि अर्ज कसा करायचा?",
+     "profile": {"state": "Maharashtra", "occupation": "farmer"}},
+    {"clip": "market.mp3",
+     "transcript": "What is the price of tomato in Kerala markets today?",
+     "profile": {"state": "Kerala", "district": "Alappuzha"}},
+    {"transcript": "Which schemes am I eligible for?",
+     "profile": {"state": "Karnataka", "gender": "female", "age": 32, "occupation": "weaver", "annual_income": 90000}},
+    {"transcript": "How do I apply for the Telangana 2BHK housing scheme?",
+     "profile": {"state": "Telangana"}},
+    {"transcript": "What pension schemes are there for senior citizens in Andhra Pradesh?",
+     "profile": {"state": "Andhra Pradesh", "age": 67}},
+    {"transcript": "Tell me the modal price of onion and potato in my district.",
+     "profile": {"state": "Kerala", "district": "Alappuzha"}},
+]
+
+REPLY_SENTENCES = [
+    "Based on the information available, here is what applies to you.",
+    "The scheme provides direct financial assistance to eligible beneficiaries.",
+    "You can apply at the nearest Common Service Centre or on the official portal.",
+    "Keep your Aadhaar card, bank passbook and land records ready when you apply.",
+]
+
+
+def jitter(seconds: float) -> float:
+    return seconds * random.uniform(0.8, 1.2) if seconds > 0 else 0.0
+
+
+class Latency:
+    stt = 0.3
+    llm_first_token = 0.6
+    llm_per_chunk = 0.05
+    tts = 0.2
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.cached_content_token_count = 0
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt_tokens, len(text) // 4 + 1)
+
+
+def _message_text(message) -> str:
+    if isinstance(message, str):
+        return message
+    if isinstance(message, list):
+        return " ".join(part for part in message if isinstance(part, str))
+    return str(message)
+
+
+class FakeStream:
+    """Iterates reply chunks like a streamed Gemini response."""
+
+    def __init__(self, chat: "FakeChat", message, prompt_tokens: int):
+        self.chat = chat
+        self.message = message
+        self.usage_metadata = FakeUsage(prompt_tokens, 0)
+
+    def __iter__(self):
+        time.sleep(jitter(Latency.llm_first_token))
+        reply = []
+        for sentence in REPLY_SENTENCES:
+            time.sleep(jitter(Latency.llm_per_chunk))
+            reply.append(sentence)
+            yield FakeResponse(sentence + " ")
+        text = " ".join(reply)
+        self.usage_metadata.candidates_token_count = len(text) // 4 + 1
+        self.chat.history.extend([
+            {"role": "user", "parts": [_message_text(self.message)]},
+            {"role": "model", "parts": [text]},
+        ])
+
+
+class FakeChat:
+    def __init__(self, model: "FakeModel", history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def _prompt_tokens(self, message) -> int:
+        history = sum(len(str(entry)) for entry in self.history)
+        return (len(self.model.system_instruction or "") + history + len(_message_text(message))) // 4 + 1
+
+    def send_message(self, message, stream: bool = False, generation_config=None, **kwargs):
+        prompt_tokens = self._prompt_tokens(message)
+        if stream:
+            return FakeStream(self, message, prompt_tokens)
+        time.sleep(jitter(Latency.llm_first_token + Latency.llm_per_chunk * len(REPLY_SENTENCES)))
+        answer = " ".join(REPLY_SENTENCES)
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            # Single-call mode: the audio part is the question
+            audio = next((part["data"] for part in message if isinstance(part, dict)), b"")
+            text = json.dumps({"transcript": transcript_for(audio), "answer": answer}, ensure_ascii=False)
+        else:
+            text = answer
+        self.history.extend([
+            {"role": "user", "parts": [_message_text(message)]},
+            {"role": "model", "parts": [text]},
+        ])
+        return FakeResponse(text, prompt_tokens)
+
+
+class FakeModel:
+    """Stands in for google.generativeai.GenerativeModel."""
+
+    def __init__(self, model_name: str = "", system_instruction: Optional[str] = None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def start_chat(self, history=None):
+        return FakeChat(self, history)
+
+    def generate_content(self, contents, **kwargs):
+        # Only speech-to-text calls generate_content directly
+        time.sleep(jitter(Latency.stt))
+        audio = next((part["data"] for part in contents if isinstance(part, dict)), b"")
+        return FakeResponse(transcript_for(audio))
+
+
+def fake_gtts_bytes(text: str, lang_code: str) -> bytes:
+    time.sleep(jitter(Latency.tts))
+    # Roughly the size of a gTTS MP3 for the text
+    return b"\xff\xf3" + os.urandom(min(len(text) * 60, 64 * 1024))
+
+
+_transcripts: Dict[str, str] = {}
+
+
+def transcript_for(audio: bytes) -> str:
+    return _transcripts.get(hashlib.sha1(audio).hexdigest(), "What schemes are available for farmers?")
+
+
+def load_queries() -> List[Dict]:
+    """Sample queries with their audio bytes; text-only queries get a synthetic clip."""
+    queries = []
+    for i, query in enumerate(SAMPLE_QUERIES):
+        clip = AUDIO_DIR / query["clip"] if query.get("clip") else None
+        audio = clip.read_bytes() if clip is not None and clip.exists() else f"clip-{i}".encode("utf-8") * 512
+        _transcripts[hashlib.sha1(audio).hexdigest()] = query["transcript"]
+        queries.append(dict(query, audio=audio, name=clip.name if clip is not None else f"clip-{i}.mp3"))
+    return queries
+
+
+def install_fakes(cold: bool):
+    """Swap Gemini for the stand-in and point the caches at scratch space, before the app is imported."""
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ["STT_BACKEND"] = "gemini"
+    import google.generativeai as genai
+
+    genai.GenerativeModel = FakeModel
+    genai.configure = lambda **kwargs: None
+
+    import answer_cache
+    import tts_cache
+
+    # Synthesized audio goes to a scratch directory, not the real TTS cache
+    scratch = tempfile.mkdtemp(prefix="benchmark-tts-")
+    tts_cache._cache = tts_cache.TTSCache(cache_dir=Path(scratch), max_bytes=0 if cold else 200 * 1024 * 1024)
+    if cold:
+        answer_cache._cache = answer_cache.AnswerCache(max_entries=0)
+
+
+def _load_repo_module(path: Path, module_name: str):
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_mcp_server():
+    """
+    Import the repo's mcp/server.py from its file.
+
+    The repo's mcp/ has no __init__.py, and fastmcp needs the installed mcp
+    package, which always wins over a namespace package: "mcp.server" would
+    be the SDK's. The sibling modules server.py imports as mcp.<name> are
+    registered under those names first.
+    """
+    sys.path.insert(0, str(BASE_DIR))
+    for name in ("gtts_demo", "gemini"):
+        _load_repo_module(BASE_DIR / "mcp" / f"{name}.py", f"mcp.{name}")
+    return _load_repo_module(BASE_DIR / "mcp" / "server.py", "govt_schemes_mcp_server")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def chat_request(main, query: Dict, mode: str, stream: bool) -> Dict:
+    from fastapi import UploadFile
+    from fastapi.responses import StreamingResponse
+    from starlette.datastructures import Headers
+
+    upload = UploadFile(file=io.BytesIO(query["audio"]), filename=query["name"],
+                        headers=Headers({"content-type": "audio/mpeg"}))
+    started = time.perf_counter()
+    response = await main.govt_scheme(file=upload, user_profile_json=json.dumps(query["profile"]),
+                                      session_id=None, stream=stream, mode=mode,
+                                      audio_format=None, accept=None)
+    first_audio = None
+    if isinstance(response, StreamingResponse):
+        async for _ in response.body_iterator:
+            if first_audio is None:
+                first_audio = time.perf_counter() - started
+    status = getattr(response, "status_code", 400) if not isinstance(response, dict) else 400
+    return {"seconds": time.perf_counter() - started, "first_audio": first_audio, "status": status}
+
+
+async def mcp_request(tools: Dict, query: Dict, index: int) -> Dict:
+    started = time.perf_counter()
+    # Mix the three tools the way agent clients fan out
+    kind = index % 3
+    if kind == 0:
+        result = await tools["get_scheme_information"](query["transcript"])
+    elif kind == 1:
+        result = await tools["get_state_schemes"](query["profile"].get("state", "Karnataka"))
+    else:
+        result = await tools["get_scheme_details"]("PM Kisan Samman Nidhi", query["profile"].get("state"))
+    status = 500 if str(result).startswith("Error:") else 200
+    return {"seconds": time.perf_counter() - started, "first_audio": None, "status": status}
+
+
+async def run(args) -> Dict:
+    queries = load_queries()
+    if args.target == "mcp":
+        server = load_mcp_server()
+        tools = {name: getattr(getattr(server, name), "fn", getattr(server, name))
+                 for name in ("get_scheme_information", "get_state_schemes", "get_scheme_details")}
+        make = lambda i: mcp_request(tools, queries[i % len(queries)], i)
+    else:
+        import main
+
+        main.gtts_bytes = fake_gtts_bytes
+        stream = args.mode == "stream"
+        mode = "two-call" if stream else args.mode
+        make = lambda i: chat_request(main, queries[i % len(queries)], mode, stream)
+
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with limit:
+            try:
+                return await make(i)
+            except Exception as e:
+                return {"seconds": 0.0, "first_audio": None, "status": type(e).__name__}
+
+    # Warm up the knowledge base, market store and caches outside the measurement
+    await one(0)
+    tracemalloc.start()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ok = [r["seconds"] for r in results if r["status"] == 200]
+    first_audio = [r["first_audio"] for r in results if r["first_audio"] is not None]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    report = {
+        "target": args.target,
+        "mode": args.mode if args.target == "chat" else "tools",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "statuses": statuses,
+        "throughput_rps": round(len(ok) / wall, 2) if wall else 0.0,
+        "latency_ms": {f"p{p}": round(percentile(ok, p) * 1000, 1) for p in (50, 95, 99)},
+        "peak_traced_mb": round(peak / 1024 / 1024, 2),
+    }
+    if first_audio:
+        report["first_audio_ms"] = {f"p{p}": round(percentile(first_audio, p) * 1000, 1) for p in (50, 95, 99)}
+    try:
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux
+        report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        pass
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency benchmark with stand-in Gemini and gTTS")
+    parser.add_argument("--target", choices=["chat", "mcp"], default="chat")
+    parser.add_argument("--mode", choices=["two-call", "single-call", "stream"], default="two-call")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stt-latency", type=float, default=Latency.stt, help="Seconds per transcription")
+    parser.add_argument("--llm-latency", type=float, default=Latency.llm_first_token,
+                        help="Seconds to the first token")
+    parser.add_argument("--llm-chunk-latency", type=float, default=Latency.llm_per_chunk,
+                        help="Seconds per streamed sentence")
+    parser.add_argument("--tts-latency", type=float, default=Latency.tts, help="Seconds per synthesis")
+    parser.add_argument("--cold", action="store_true", help="Disable the answer and TTS caches")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    Latency.stt = args.stt_latency
+    Latency.llm_first_token = args.llm_latency
+    Latency.llm_per_chunk = args.llm_chunk_latency
+    Latency.tts = args.tts_latency
+    install_fakes(args.cold)
+    # Keep the benchmark's own output to the report
+    import logging
+
+    logging.getLogger("govt_scheme.requests").setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
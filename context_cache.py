@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from google.genai import types
+
+from answer_cache import corpus_version
+from gemini_client import call_gemini
+from market import format_rows, get_market_store
+from retrieval import format_chunks, get_index, normalize_state
+
+logger = logging.getLogger(__name__)
+
+# Explicit context caching needs a pinned model version
+CACHE_MODEL = os.getenv("CONTEXT_CACHE_MODEL", "gemini-2.0-flash-001")
+# A prefix is re-registered this long before it would expire on the provider
+REFRESH_MARGIN_SECONDS = 60
+# After a failed registration the state is served without a cache for this long
+RETRY_AFTER_SECONDS = 300
+
+
+def corpus_prefix(state: Optional[str] = None) -> str:
+    """
+    The static context for questions from a state.
+
+    Every scheme of the state and the central schemes, plus the state's
+    market prices; without a state, the whole corpus and price table.
+    """
+    kb = get_index()
+    chunks = []
+    for state_key in kb.search_states(state):
+        chunks.extend(kb.scheme_texts(state_key))
+
+    # One snapshot throughout, in case the price table is reloaded meanwhile
+    prices = get_market_store().snapshot
+    if normalize_state(state):
+        labels = [label for label in prices.labels["State"] if normalize_state(label) == normalize_state(state)]
+        rows = prices.lookup(state=labels)
+    else:
+        rows = [prices.row(i) for i in range(prices.size)]
+    return f"Schemes:\n{format_chunks(chunks)}\n\nMarket prices:\n{format_rows(rows)}"
+
+
+class ContextCache:
+    """
+    Registers the scheme corpus once per state as cached content with Gemini.
+
+    Questions then send only themselves on top of the cached prefix. A prefix
+    is re-registered when the corpus version changes or it is about to expire.
+    If registration fails (quota, unsupported model, prefix too small) the
+    caller falls back to sending retrieved context with each question.
+
+    Args:
+        client: google.genai Client the prefixes are registered with
+        system_prompt (str): System instruction stored with each prefix
+        model (str): Pinned model version the prefixes are created for
+        ttl_seconds (int): How long the provider keeps a prefix
+    """
+
+    def __init__(self, client, system_prompt: str, model: str = CACHE_MODEL, ttl_seconds: int = 3600):
+        self.client = client
+        self.system_prompt = system_prompt
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        # state key -> (corpus version, cached content name, expires_at)
+        self._entries: Dict[str, Tuple[str, str, float]] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _create(self, state: Optional[str], version: str) -> str:
+        cache = call_gemini(
+            self.client.caches.create,
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                display_name=f"schemes-{normalize_state(state) or 'all'}-{version}",
+                system_instruction=self.system_prompt,
+                contents=[corpus_prefix(state)],
+                ttl=f"{self.ttl_seconds}s",
+            ),
+        )
+        return cache.name
+
+    def _delete(self, name: str):
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            logger.warning("Could not delete cached content %s: %s", name, e)
+
+    def get(self, state: Optional[str] = None) -> Optional[str]:
+        """Name of the cached prefix for the state, or None if caching is unavailable."""
+        key = normalize_state(state) or "all"
+        version = corpus_version()
+        with self._key_lock(key):
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[2] - REFRESH_MARGIN_SECONDS > now:
+                return entry[1]
+            if self._failed_until.get(key, 0) > now:
+                return None
+            try:
+                name = self._create(state, version)
+            except Exception as e:
+                logger.warning("Context caching unavailable for %s: %s", key, e)
+                self._failed_until[key] = now + RETRY_AFTER_SECONDS
+                return None
+            self._entries[key] = (version, name, now + self.ttl_seconds)
+        if entry is not None:
+            self._delete(entry[1])
+        return name
+
+    def invalidate(self, state: Optional[str] = None):
+        """Forget the prefix for a state, e.g. after the provider reports it missing."""
+        key = normalize_state(state) or "all"
+        with self._key_lock(key):
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._delete(entry[1])
+
+    def ask(self, question: str, state: Optional[str] = None) -> Optional[str]:
+        """
+        Answer the question on top of the cached prefix.
+
+        Returns:
+            str: The response text, or None if no prefix could be used
+        """
+        name = self.get(state)
+        if name is None:
+            return None
+        try:
+            response = call_gemini(
+                self.client.models.generate_content,
+                model=self.model,
+                contents=f"Question: {question}",
+                config=types.GenerateContentConfig(cached_content=name),
+            )
+        except Exception as e:
+            logger.warning("Cached content %s failed: %s", name, e)
+            self.invalidate(state)
+            return None
+        return response.text
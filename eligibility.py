@@ -0,0 +1,261 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+ACRES_PER_HECTARE = 2.471
+
+# Occupation keyword -> canonical occupation
+OCCUPATIONS = {
+    "farmer": "farmer", "agricultur": "farmer", "cultivator": "farmer", "kisan": "farmer", "raitha": "farmer",
+    "fisherm": "fisherman", "fisher": "fisherman",
+    "weaver": "weaver", "handloom": "weaver",
+    "street vendor": "street vendor", "hawker": "street vendor",
+    "student": "student",
+    "construction worker": "construction worker", "labour": "labourer", "laborer": "labourer",
+    "artisan": "artisan", "auto driver": "driver", "taxi driver": "driver",
+}
+
+CASTES = {
+    r"\bsc\b|scheduled caste": "sc",
+    r"\bst\b|scheduled tribe": "st",
+    r"\bobc\b|backward class": "obc",
+    r"minorit": "minority",
+}
+
+_FEMALE_RE = re.compile(r"\b(women|woman|girls?|female|widows?|mothers?|pregnant|daughters?)\b", re.IGNORECASE)
+_MALE_RE = re.compile(r"\b(men|man|boys?|male|groom)\b", re.IGNORECASE)
+_NUMBER = r"(\d[\d,]*(?:\.\d+)?)"
+_AGE_RANGE_RE = re.compile(rf"(?:between|from)\s+{_NUMBER}\s*(?:years?\s*)?(?:and|to|-)\s*{_NUMBER}\s*years", re.IGNORECASE)
+_MIN_AGE_RE = re.compile(rf"{_NUMBER}\s*years?\s*(?:of age\s*)?(?:or|and)\s*(?:above|more|older)|(?:minimum age|at least)\s*(?:of\s*)?{_NUMBER}\s*years|above\s*{_NUMBER}\s*years", re.IGNORECASE)
+_MAX_AGE_RE = re.compile(rf"(?:below|less than|under|not more than|maximum age(?: of| is)?|upto|up to)\s*{_NUMBER}\s*years", re.IGNORECASE)
+_INCOME_RE = re.compile(
+    rf"income[^.]{{0,80}}?(?:less than|below|not more than|up ?to|not exceed(?:ing)?|within|maximum(?: of)?)\s*(?:rs\.?|inr|₹)?\s*{_NUMBER}\s*(lakh|lakhs|crore|thousand)?",
+    re.IGNORECASE,
+)
+_LAND_RE = re.compile(
+    rf"(?:less than|below|up ?to|not more than|upto|maximum(?: of)?)\s*{_NUMBER}\s*(acres?|hectares?|ha\b)",
+    re.IGNORECASE,
+)
+# Criteria stated as explicit thresholds; gender, occupation and caste are inferred from mere mentions
+THRESHOLD_CRITERIA = ("min_age", "max_age", "max_income", "max_land_acres")
+# Fewer confirmed schemes than this and the rules engine does not answer on its own
+MIN_CONFIRMED_SCHEMES = 3
+_UNIT = {"lakh": 100000, "lakhs": 100000, "crore": 10000000, "thousand": 1000}
+
+# "Which schemes am I eligible for" needs an eligibility word and a question about schemes in general
+_ELIGIBILITY_WORD_RE = re.compile(r"eligib|qualify|पात्र|योग्य|ಅರ್ಹ|అర్హ|தகுதி|അർഹ", re.IGNORECASE)
+# Plural "schemes", "any/which scheme", or "which" in Hindi, Marathi, Kannada, Telugu, Tamil and Malayalam
+_GENERIC_SCHEME_RE = re.compile(
+    r"\b(?:schemes|yojanas)\b|\b(?:any|which|what)\s+(?:government\s+|govt\.?\s+)?(?:scheme|yojana)\b"
+    r"|कौन|किन|योजनाओं|कोणत्या|योजनां|ಯಾವ|ఏ\s|ఏయే|ఏవి|எந்த|ഏത",
+    re.IGNORECASE,
+)
+_FOR_ME_RE = re.compile(r"\b(?:schemes|yojanas)\b[^?]*\bfor me\b", re.IGNORECASE)
+# "the PM Kisan scheme", "Rythu Bandhu yojana": a word other than a determiner right before singular "scheme"
+_NAMED_SCHEME_RE = re.compile(
+    r"\b(?!(?:any|which|what|a|an|the|this|that|all|other|government|govt|some|such|central|state|new)\b)"
+    r"[\w-]+\s+(?:scheme|yojana)\b(?!s)",
+    re.IGNORECASE,
+)
+
+
+def _number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def parse_number(value) -> Optional[float]:
+    """Read a number from a profile field like 120000, "1,20,000" or "2.5 acres"."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(_NUMBER, str(value))
+    if not match:
+        return None
+    number = _number(match.group(1))
+    unit = re.search(r"lakh|crore|thousand|hectare", str(value), re.IGNORECASE)
+    if unit:
+        word = unit.group(0).lower()
+        number *= ACRES_PER_HECTARE if word == "hectare" else _UNIT[word]
+    return number
+
+
+def extract_criteria(text: str) -> Dict:
+    """
+    Pull structured eligibility criteria out of free-text scheme eligibility.
+
+    Only criteria the text states explicitly are returned; anything missing
+    is treated as "no restriction" when profiles are checked.
+    """
+    criteria: Dict = {}
+    if not text:
+        return criteria
+    if _FEMALE_RE.search(text) and not _MALE_RE.search(text):
+        criteria["gender"] = "female"
+
+    age_range = _AGE_RANGE_RE.search(text)
+    if age_range:
+        criteria["min_age"], criteria["max_age"] = _number(age_range.group(1)), _number(age_range.group(2))
+    else:
+        min_age = _MIN_AGE_RE.search(text)
+        if min_age:
+            criteria["min_age"] = _number(next(g for g in min_age.groups() if g))
+        max_age = _MAX_AGE_RE.search(text)
+        if max_age:
+            criteria["max_age"] = _number(max_age.group(1))
+
+    income = _INCOME_RE.search(text)
+    if income:
+        criteria["max_income"] = _number(income.group(1)) * _UNIT.get((income.group(2) or "").lower(), 1)
+
+    land = _LAND_RE.search(text)
+    if land:
+        acres = _number(land.group(1))
+        criteria["max_land_acres"] = acres * ACRES_PER_HECTARE if land.group(2).lower().startswith("h") else acres
+
+    lowered = text.lower()
+    occupations = sorted({occ for keyword, occ in OCCUPATIONS.items() if keyword in lowered})
+    if occupations:
+        criteria["occupations"] = occupations
+    castes = sorted({caste for pattern, caste in CASTES.items() if re.search(pattern, lowered)})
+    if castes:
+        criteria["castes"] = castes
+    return criteria
+
+
+def _canonical_occupation(value: str) -> str:
+    lowered = value.lower()
+    for keyword, occupation in OCCUPATIONS.items():
+        if keyword in lowered:
+            return occupation
+    return lowered.strip()
+
+
+def check(profile: Dict, criteria: Dict) -> Tuple[Optional[bool], List[str]]:
+    """
+    Check a profile against a scheme's criteria.
+
+    Returns:
+        (eligible, matched): eligible is False if any stated criterion is
+        violated, True if at least one criterion was checked and all passed,
+        and None if nothing could be checked; matched lists the criteria met.
+    """
+    matched = []
+    checked = False
+
+    gender = str(profile.get("gender") or "").lower()
+    if "gender" in criteria and gender:
+        checked = True
+        if not gender.startswith("f") and gender not in ("woman", "women"):
+            return False, matched
+        matched.append("gender")
+
+    age = parse_number(profile.get("age"))
+    if age is not None and ("min_age" in criteria or "max_age" in criteria):
+        checked = True
+        if age < criteria.get("min_age", 0) or age > criteria.get("max_age", float("inf")):
+            return False, matched
+        matched.append("age")
+
+    income = parse_number(profile.get("annual_income"))
+    if income is not None and "max_income" in criteria:
+        checked = True
+        if income > criteria["max_income"]:
+            return False, matched
+        matched.append("income")
+
+    land = parse_number(profile.get("land_holding"))
+    if land is not None and "max_land_acres" in criteria:
+        checked = True
+        if land > criteria["max_land_acres"]:
+            return False, matched
+        matched.append("land holding")
+
+    occupation = profile.get("occupation")
+    if occupation and "occupations" in criteria:
+        checked = True
+        if _canonical_occupation(str(occupation)) not in criteria["occupations"]:
+            return False, matched
+        matched.append("occupation")
+
+    caste = str(profile.get("caste") or "").lower()
+    if caste and "castes" in criteria:
+        checked = True
+        if not any(c in caste for c in criteria["castes"]):
+            return False, matched
+        matched.append("caste")
+
+    return (True if checked else None), matched
+
+
+def is_eligibility_question(question: str) -> bool:
+    """
+    True for "which schemes am I eligible for" style questions.
+
+    Questions about one particular scheme ("Am I eligible for the PM Kisan
+    scheme?", "How do I apply for Rythu Bandhu?") are not: they need that
+    scheme's details, not a list of schemes.
+    """
+    question = question or ""
+    if _NAMED_SCHEME_RE.search(question):
+        return False
+    if _FOR_ME_RE.search(question):
+        return True
+    return bool(_ELIGIBILITY_WORD_RE.search(question) and _GENERIC_SCHEME_RE.search(question))
+
+
+def _name_key(name: str) -> str:
+    return re.sub(r"[\W_]+", " ", name.lower()).strip()
+
+
+def eligible_schemes(kb, profile: Dict, limit: int = 10) -> List[Dict]:
+    """
+    Schemes of the profile's state and central schemes the profile is confirmed eligible for.
+
+    Only schemes with at least one criterion checked and met are listed; a
+    scheme whose criteria could not be checked is not evidence of anything.
+    Schemes with more criteria confirmed come first, each name once.
+    """
+    state = profile.get("state") if isinstance(profile, dict) else None
+    results, seen = [], set()
+    for state_key in kb.search_states(state):
+        for scheme in kb.schemes(state_key):
+            eligible, matched = check(profile, scheme["criteria"])
+            key = _name_key(scheme["name"])
+            if eligible is True and key not in seen:
+                seen.add(key)
+                results.append(dict(scheme, matched=matched))
+    results.sort(key=lambda s: len(s["matched"]), reverse=True)
+    return results[:limit]
+
+
+def excluded_scheme_ids(kb, profile: Dict, states: List[str]) -> Dict[str, set]:
+    """
+    {state: {scheme_id, ...}} of schemes the profile is definitely not eligible for.
+
+    Only threshold criteria (age, income, land holding) can exclude a scheme
+    here: a scheme's text mentioning women or students does not mean it is
+    restricted to them, and dropping its context would hide it from the user.
+    """
+    excluded = {}
+    for state_key in states:
+        excluded[state_key] = set()
+        for scheme in kb.schemes(state_key):
+            thresholds = {k: v for k, v in scheme["criteria"].items() if k in THRESHOLD_CRITERIA}
+            if thresholds and check(profile, thresholds)[0] is False:
+                excluded[state_key].add(scheme["id"])
+    return excluded
+
+
+def format_eligible(schemes: List[Dict]) -> str:
+    """Plain-text answer listing the schemes, suitable for speech."""
+    if not schemes:
+        return "I could not find schemes in our records that match your profile."
+    lines = ["Based on your profile, you may be eligible for these schemes."]
+    for i, scheme in enumerate(schemes, 1):
+        line = f"{i}. {scheme['name']}"
+        if scheme.get("benefit_amount"):
+            line += f", benefit {scheme['benefit_amount']}"
+        if scheme["state"] != "central":
+            line += f", {scheme['state'].title()} scheme"
+        lines.append(line + ".")
+    return "\n".join(lines)
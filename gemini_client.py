@@ -0,0 +1,274 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.0-flash"
+# Per-request timeout for Gemini calls
+REQUEST_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+
+# HTTP statuses worth retrying; gRPC errors from google.api_core carry the same codes
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class GeminiUnavailable(Exception):
+    """Raised without calling Gemini when the client is shedding load."""
+
+
+class CircuitOpen(GeminiUnavailable):
+    """Gemini has been failing; calls are refused until the breaker's cool-down ends."""
+
+
+class RateLimited(GeminiUnavailable):
+    """No rate-limiter token became free within the allowed wait."""
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter: bursts up to capacity, then rate calls per second.
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (int): Most tokens held, i.e. the largest burst
+        max_wait (float): Longest a caller waits for a token before RateLimited
+    """
+
+    def __init__(self, rate: float, capacity: int, max_wait: float = 10.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise RateLimited(f"no Gemini request token within {self.max_wait:g}s")
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Stops calling Gemini after repeated failures, then lets one trial call through.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the breaker
+        reset_timeout (float): Seconds the breaker stays open before a trial call
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_running):
+                raise CircuitOpen(f"Gemini circuit open after {self.failures} failures")
+            if state == "half-open":
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+def _status(error: Exception) -> Optional[int]:
+    """HTTP-style status of an SDK error, if it has one."""
+    for attr in ("code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, GeminiUnavailable):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = _status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    # google.api_core exceptions without a numeric code
+    return type(error).__name__ in {"ResourceExhausted", "ServiceUnavailable", "InternalServerError",
+                                    "DeadlineExceeded", "TooManyRequests", "GatewayTimeout"}
+
+
+class GeminiCaller:
+    """
+    Runs Gemini calls through a rate limiter and circuit breaker, retrying transient errors.
+
+    Retries use exponential backoff with full jitter. Errors that are not
+    transient (bad request, auth) are raised at once and do not count
+    against the breaker.
+
+    Args:
+        limiter (TokenBucket): Shared by every call
+        breaker (CircuitBreaker): Shared by every call
+        max_retries (int): Retries after the first attempt
+        base_delay (float): First backoff ceiling in seconds, doubled per retry
+        max_delay (float): Largest backoff ceiling
+    """
+
+    def __init__(self, limiter: TokenBucket, breaker: CircuitBreaker, max_retries: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 8.0):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def __call__(self, fn: Callable, *args, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The service answered; it is not down
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logger.warning("Gemini call failed (%s), retry %d in %.2fs", e, attempt + 1, delay)
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict:
+        return {"breaker": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "retries": self.retries, "tokens": round(self.limiter.tokens, 2)}
+
+
+_caller: Optional[GeminiCaller] = None
+_client = None
+_configured = False
+_lock = threading.Lock()
+
+
+def get_caller() -> GeminiCaller:
+    """
+    Return the process-wide caller every Gemini request goes through.
+
+    Configured by GEMINI_RPS, GEMINI_BURST, GEMINI_MAX_WAIT_SECONDS,
+    GEMINI_MAX_RETRIES, GEMINI_BREAKER_FAILURES and GEMINI_BREAKER_RESET_SECONDS.
+    """
+    global _caller
+    if _caller is None:
+        with _lock:
+            if _caller is None:
+                _caller = GeminiCaller(
+                    TokenBucket(
+                        rate=float(os.getenv("GEMINI_RPS", "10")),
+                        capacity=int(os.getenv("GEMINI_BURST", "20")),
+                        max_wait=float(os.getenv("GEMINI_MAX_WAIT_SECONDS", "10")),
+                    ),
+                    CircuitBreaker(
+                        failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+                        reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30")),
+                    ),
+                    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+                )
+    return _caller
+
+
+def call_gemini(fn: Callable, *args, **kwargs) -> Any:
+    """Call fn (a Gemini SDK method) with rate limiting, retries and the circuit breaker."""
+    return get_caller()(fn, *args, **kwargs)
+
+
+def _api_key() -> str:
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("Please set GOOGLE_API_KEY environment variable")
+    return api_key
+
+
+def configure():
+    """Configure google.generativeai once per process, on first use."""
+    global _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                genai.configure(api_key=_api_key())
+                _configured = True
+
+
+def request_options() -> Dict:
+    """Per-call options for google.generativeai requests."""
+    return {"timeout": REQUEST_TIMEOUT}
+
+
+def generative_model(system_instruction: Optional[str] = None, model_name: str = MODEL_NAME):
+    """A google.generativeai model on the shared, configured transport."""
+    configure()
+    return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+
+def get_client():
+    """
+    The process-wide google.genai Client.
+
+    Sharing one client means one HTTP connection pool for every module
+    that uses the newer SDK.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from google import genai as genai_sdk
+                from google.genai import types
+
+                _client = genai_sdk.Client(
+                    api_key=_api_key(),
+                    http_options=types.HttpOptions(timeout=int(REQUEST_TIMEOUT * 1000)),
+                )
+    return _client
@@ -0,0 +1,733 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from eligibility import extract_criteria
+from language import INDIC_STOPWORDS, gloss_query
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+CONTEXT_FILE = BASE_DIR / "context.txt"
+STATE_DIR = BASE_DIR / "state"
+# Older per-state layout: state_schemes/<state>/<state>_combined.txt
+STATE_SCHEMES_DIR = BASE_DIR / "state_schemes"
+KB_DIR = Path(os.getenv("KB_DIR", BASE_DIR / ".cache" / "kb"))
+MANIFEST_FILE = "manifest.json"
+# Held while building, so only one process rebuilds the knowledge base at a time
+LOCK_FILE = "build.lock"
+# Bumped whenever the shard layout changes so existing knowledge bases get rebuilt
+SCHEMA_VERSION = 8
+# How often a process looks for a newly published manifest
+RELOAD_CHECK_SECONDS = float(os.getenv("KB_RELOAD_SECONDS", "5"))
+# Shards dropped from the manifest are deleted this long after, so processes still on the previous version can finish
+SHARD_GRACE_SECONDS = 600
+
+# Rough upper bound on characters per chunk; long articles are split on paragraphs
+MAX_CHUNK_CHARS = 1500
+# Structured fields are excerpts, not whole sections
+MAX_FIELD_CHARS = 1200
+
+# find_scheme: search hits considered, and the share of a name's distinctive words its title must contain
+FIND_CANDIDATES = 10
+MIN_NAME_MATCH = 0.75
+# Words that do not tell one scheme's name from another's
+_GENERIC_NAME_WORDS = {"scheme", "schemes", "yojana", "yojna", "the", "of", "for", "and", "in", "a", "to",
+                       "programme", "program", "mission", "abhiyan", "portal", "online", "2018", "2019", "2020"}
+# Shorthand used in scheme names
+_NAME_ABBREVIATIONS = {"pm": ["pradhan", "mantri"], "pradhanmantri": ["pradhan", "mantri"]}
+
+# Shards are opened read-only and memory-mapped up to this size
+SHARD_MMAP_BYTES = 256 * 1024 * 1024
+
+_SECTION_RE = re.compile(r"^=== (.+?) SCHEMES ===\s*$", re.MULTILINE)
+# Word characters plus Indic vowel signs and joiners, which \w leaves out; FTS5 keeps them inside tokens
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0963\u0966-\u0dff\u200c\u200d]+")
+_NOISE_RE = re.compile(r"^\(adsbygoogle.*$|^SAVE AS PDF\s*$", re.MULTILINE)
+# Table-of-contents headings run together: "...SchemeEligibility", "...Form 2020Karnataka ...",
+# "...[Apply]AP YSR ..." and numbered lists ("...Form2. Download ...")
+_HEADING_SPLIT_RE = re.compile(r"(?<=[a-z)\]])(?=[A-Z])|(?<=\d\d)(?=[A-Z])|(?<=[A-Za-z)])(?=\d\.\s)")
+# The next scheme's title is glued to the previous entry's website URL
+_WEBSITE_TITLE_RE = re.compile(r"^Official Website:\s*\S*?[a-z0-9/](?=[A-Z][a-z]+\s)")
+_WEBSITE_RE = re.compile(r"^Official Website:\s*\S+?(?:/|\.in|\.com|\.org|\.net)(?=[A-Z])")
+# Central scheme entries start at "Launched: <date>", written without the colon in part of the list
+_LAUNCHED_RE = re.compile(r"^Launched[: ]")
+_AMOUNT_RE = re.compile(r"(?:Rs\.?|INR|₹)\s*\d[\d,]*(?:\.\d+)?(?:\s*(?:lakh|crore|thousand))?", re.IGNORECASE)
+# Central scheme entries have no sections; their benefit is stated on the "Main Objective" line
+_OBJECTIVE_RE = re.compile(r"^Main Objective:\s*(.+)$", re.MULTILINE)
+_ELIGIBILITY_RE = re.compile(r"eligib|who can apply", re.IGNORECASE)
+_BENEFIT_RE = re.compile(r"benefit|assistance|amount|subsidy|pension|incentive", re.IGNORECASE)
+_REGISTRATION_RE = re.compile(r"regist|apply|application|how to", re.IGNORECASE)
+
+
+def normalize_state(state: Optional[str]) -> str:
+    """Reduce a state name to a comparable key ("Tamil Nadu" -> "tamilnadu")."""
+    if not state:
+        return ""
+    return re.sub(r"[^a-z]", "", state.lower())
+
+
+def scheme_key(name: str) -> str:
+    """Reduce a scheme name to a comparable key, ignoring case and punctuation."""
+    return re.sub(r"[\W_]+", " ", name.lower()).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _name_terms(name: str) -> List[str]:
+    """Distinctive words of a scheme name, with "PM" spelled out."""
+    terms = []
+    for token in tokenize(name):
+        terms.extend(_NAME_ABBREVIATIONS.get(token, [token]))
+    return [t for t in dict.fromkeys(terms) if t not in _GENERIC_NAME_WORDS]
+
+
+def _state_from_filename(path: Path) -> str:
+    # Files are named both "karnataka_combined.txt" and "andhra-pradesh-combined.txt"
+    return normalize_state(re.sub(r"[-_]combined$", "", path.stem))
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+
+
+def _toc_headings(lines: List[str]) -> List[str]:
+    """Section headings listed in an article's table of contents."""
+    for i, line in enumerate(lines):
+        if line.strip() == "Table of Contents":
+            for toc in lines[i + 1:]:
+                if toc.strip():
+                    return [h.strip() for h in _HEADING_SPLIT_RE.split(toc.strip()) if h.strip()]
+    return []
+
+
+def _article_title(lines: List[str]) -> str:
+    """Pick a readable scheme heading from the first lines of an article."""
+    headings = _toc_headings(lines)
+    if headings:
+        return headings[0][:120]
+    for line in lines:
+        line = line.strip()
+        if line:
+            return _WEBSITE_RE.sub("", _WEBSITE_TITLE_RE.sub("", line))[:120]
+    return ""
+
+
+def _split_articles(text: str) -> List[List[str]]:
+    """Split a state corpus into articles, one per scheme."""
+    lines = text.splitlines()
+    starts = [0]
+    for i, line in enumerate(lines):
+        if line.strip() == "Table of Contents" and i > 0:
+            starts.append(i)
+        elif _LAUNCHED_RE.match(line) and i > 0:
+            # Central schemes list: the title sits on the line above "Launched"
+            start = i - 1
+            while start > 0 and lines[start].strip().isdigit():
+                start -= 1
+            starts.append(start)
+    starts = sorted(set(starts))
+    bounds = zip(starts, starts[1:] + [len(lines)])
+    return [lines[a:b] for a, b in bounds if any(l.strip() for l in lines[a:b])]
+
+
+def _split_paragraphs(body: str) -> List[str]:
+    """Pack paragraphs into pieces of at most MAX_CHUNK_CHARS characters."""
+    pieces, current = [], ""
+    for para in re.split(r"\n\s*\n", body):
+        para = para.strip()
+        if not para:
+            continue
+        if current and len(current) + len(para) > MAX_CHUNK_CHARS:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n{para}" if current else para
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _sections(lines: List[str]) -> Dict[str, str]:
+    """Map each table-of-contents heading to the text under it."""
+    headings = set(_toc_headings(lines))
+    sections, current, buffer = {}, None, []
+    for line in lines:
+        stripped = line.strip()
+        if stripped in headings:
+            if current is not None:
+                sections[current] = "\n".join(buffer).strip()
+            current, buffer = stripped, []
+        elif current is not None:
+            buffer.append(line)
+    if current is not None:
+        sections[current] = "\n".join(buffer).strip()
+    return sections
+
+
+def _field(sections: Dict[str, str], pattern: re.Pattern) -> str:
+    for heading, text in sections.items():
+        if pattern.search(heading) and text:
+            return text[:MAX_FIELD_CHARS]
+    return ""
+
+
+def _benefit_amount(benefit_text: str) -> str:
+    """First rupee figure of the benefit text that a beneficiary could receive."""
+    for match in _AMOUNT_RE.finditer(benefit_text):
+        # "Rs. 46,000 crore" is the scheme's budget, not what one person gets
+        if not match.group(0).lower().endswith("crore"):
+            return match.group(0).strip()
+    return ""
+
+
+def parse_article(lines: List[str], state: str, source: str) -> Dict:
+    """Turn one article into a scheme record with structured fields and chunks."""
+    body = "\n".join(lines).strip()
+    sections = _sections(lines)
+    eligibility = _field(sections, _ELIGIBILITY_RE)
+    registration = _field(sections, _REGISTRATION_RE)
+    objective = _OBJECTIVE_RE.search(body)
+    benefit_text = _field(sections, _BENEFIT_RE) or (objective.group(1) if objective else "")
+    # Central scheme entries have no eligibility section; criteria guessed from their objective
+    # ("free ration for 80 crore people, women ...") would rule users out wrongly, so they get none
+    return {
+        "state": state,
+        "name": _article_title(lines),
+        "eligibility": eligibility,
+        "benefit_amount": _benefit_amount(benefit_text),
+        "registration": registration,
+        "criteria": extract_criteria(eligibility),
+        "source": source,
+        "body": body,
+        "chunks": _split_paragraphs(body),
+    }
+
+
+def parse_corpus(text: str, state: str, source: str) -> List[Dict]:
+    """Parse one state's scheme text into scheme records."""
+    return [parse_article(article, state, source) for article in _split_articles(_NOISE_RE.sub("", text))]
+
+
+def source_files() -> List[Path]:
+    """Every corpus file, in all three layouts the repo has used."""
+    files = [CONTEXT_FILE] if CONTEXT_FILE.exists() else []
+    files += sorted(STATE_DIR.glob("*combined.txt"))
+    if STATE_SCHEMES_DIR.exists():
+        files += sorted(STATE_SCHEMES_DIR.glob("*/*.txt"))
+    return files
+
+
+def _file_states(path: Path) -> Dict[str, str]:
+    """Split a source file into {state: text}."""
+    text = path.read_text(encoding="utf-8")
+    if path == CONTEXT_FILE:
+        sections = _SECTION_RE.split(text)
+        # re.split yields [preamble, state, body, state, body, ...]
+        states: Dict[str, str] = {}
+        for state, body in zip(sections[1::2], sections[2::2]):
+            key = normalize_state(state)
+            states[key] = states.get(key, "") + body
+        return states
+    if path.parent.parent == STATE_SCHEMES_DIR:
+        return {normalize_state(path.parent.name): text}
+    return {_state_from_filename(path): text}
+
+
+def state_texts(files: Optional[Iterable[Path]] = None) -> Dict[str, List[Tuple[str, str]]]:
+    """Every state's text across the sources: {state: [(file name, text), ...]} in file order."""
+    texts: Dict[str, List[Tuple[str, str]]] = {}
+    for path in files if files is not None else source_files():
+        for state, text in _file_states(path).items():
+            texts.setdefault(state, []).append((path.name, text))
+    return texts
+
+
+def state_hash(parts: List[Tuple[str, str]]) -> str:
+    """Hash of one state's source text; its shard is rebuilt only when this changes."""
+    digest = hashlib.sha256(f"schema{SCHEMA_VERSION}".encode("utf-8"))
+    for name, text in parts:
+        digest.update(name.encode("utf-8") + b"\0" + text.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def parse_state(state: str, parts: List[Tuple[str, str]]) -> List[Dict]:
+    """Parse one state's text into schemes, dropping repeats of a scheme already parsed."""
+    schemes = []
+    seen = set()
+    for name, text in parts:
+        for scheme in parse_corpus(text, state, name):
+            # The same article is scraped more than once with different trailing text,
+            # so its name rather than its body identifies it
+            key = scheme_key(scheme["name"]) or hashlib.sha1(scheme["body"].encode("utf-8")).hexdigest()
+            if key in seen:
+                continue
+            seen.add(key)
+            schemes.append(scheme)
+    return schemes
+
+
+def parse_sources(files: Optional[Iterable[Path]] = None) -> Dict[str, List[Dict]]:
+    """Parse every source into {state: [scheme, ...]}."""
+    return {state: parse_state(state, parts) for state, parts in state_texts(files).items()}
+
+
+def sources_signature(files: Optional[Iterable[Path]] = None) -> Tuple:
+    """Cheap change check over the corpus files: names, mtimes and sizes."""
+    signature = []
+    for path in files if files is not None else source_files():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+# ---------------------------------------------------------------------------
+# Shards
+
+
+def write_shard(path: Path, schemes: List[Dict]):
+    """Write one state's schemes and full-text index to a fresh SQLite file."""
+    tmp_path = path.with_suffix(".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE schemes (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                eligibility TEXT,
+                benefit_amount TEXT,
+                registration TEXT,
+                criteria TEXT,
+                source TEXT,
+                body TEXT
+            );
+            CREATE VIRTUAL TABLE chunks USING fts5(
+                title, text, scheme_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 0'
+            );
+        """)
+        for scheme in schemes:
+            cursor = conn.execute(
+                "INSERT INTO schemes (name, eligibility, benefit_amount, registration, criteria, source, body)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scheme["name"], scheme["eligibility"], scheme["benefit_amount"], scheme["registration"],
+                 json.dumps(scheme["criteria"]), scheme["source"], scheme["body"]),
+            )
+            conn.executemany(
+                "INSERT INTO chunks (title, text, scheme_id) VALUES (?, ?, ?)",
+                [(scheme["name"], chunk, cursor.lastrowid) for chunk in scheme["chunks"]],
+            )
+        conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    tmp_path.replace(path)
+
+
+def read_manifest(kb_dir: Path = KB_DIR) -> Optional[Dict]:
+    """The published manifest, or None if there is none or it is unreadable."""
+    try:
+        return json.loads((Path(kb_dir) / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+_build_lock = threading.Lock()
+
+
+class _BuildLock:
+    """Serializes builds across threads, and across processes where flock exists."""
+
+    def __init__(self, kb_dir: Path):
+        self.path = kb_dir / LOCK_FILE
+
+    def __enter__(self):
+        _build_lock.acquire()
+        self.file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        _build_lock.release()
+
+
+def _collect_garbage(kb_dir: Path, manifest: Dict, now: float) -> Dict[str, float]:
+    """
+    Delete shard files retired from the manifest more than SHARD_GRACE_SECONDS ago.
+
+    A shard's grace period starts when a manifest stops using it, not when it
+    was built: processes still on the previous version keep opening it until
+    they notice the new manifest.
+
+    Returns:
+        Dict[str, float]: The retired files still kept, with the time they were retired
+    """
+    in_use = {info["file"] for info in manifest["states"].values()}
+    retired = dict(manifest.get("retired", {}))
+    for path in kb_dir.glob("*.sqlite"):
+        if path.name not in in_use:
+            retired.setdefault(path.name, now)
+    kept = {}
+    for name, retired_at in retired.items():
+        if name in in_use:
+            continue
+        if now - retired_at <= SHARD_GRACE_SECONDS:
+            kept[name] = retired_at
+            continue
+        try:
+            (kb_dir / name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError:
+            kept[name] = retired_at
+    return kept
+
+
+def _publish(kb_dir: Path, manifest: Dict):
+    tmp_manifest = kb_dir / f"{MANIFEST_FILE}.tmp"
+    tmp_manifest.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp_manifest.replace(kb_dir / MANIFEST_FILE)
+
+
+def build(kb_dir: Path = KB_DIR, full: bool = False) -> Dict:
+    """
+    Bring the knowledge base up to date with the sources and publish it.
+
+    Only states whose text changed are re-parsed and re-indexed; their
+    shards are written under new content-addressed file names, and the new
+    manifest is swapped in atomically, so processes reading the previous
+    version are never disturbed.
+
+    Args:
+        kb_dir (Path): Where the shards and the manifest live
+        full (bool): Rebuild every state, even unchanged ones
+
+    Returns:
+        Dict: The published manifest; its "rebuilt" lists the states re-indexed
+    """
+    kb_dir.mkdir(parents=True, exist_ok=True)
+    with _BuildLock(kb_dir):
+        published = read_manifest(kb_dir)
+        previous = None if full else published
+        old_states = previous.get("states", {}) if previous else {}
+        states, rebuilt = {}, []
+        for state, parts in sorted(state_texts().items()):
+            digest = state_hash(parts)
+            old = old_states.get(state)
+            if old and old.get("hash") == digest and (kb_dir / old["file"]).exists():
+                states[state] = old
+                continue
+            schemes = parse_state(state, parts)
+            shard_file = f"{state}-{digest[:16]}.sqlite"
+            write_shard(kb_dir / shard_file, schemes)
+            states[state] = {
+                "file": shard_file,
+                "hash": digest,
+                "schemes": len(schemes),
+                "chunks": sum(len(s["chunks"]) for s in schemes),
+            }
+            rebuilt.append(state)
+        # The corpus version changes exactly when some state's text does
+        version = hashlib.sha256(
+            json.dumps([SCHEMA_VERSION, {state: info["hash"] for state, info in states.items()}],
+                       sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        now = time.time()
+        if previous and previous.get("version") == version and not rebuilt:
+            retired = _collect_garbage(kb_dir, previous, now)
+            if retired != previous.get("retired", {}):
+                # Same version, so readers do not switch; only the retired list changed
+                _publish(kb_dir, dict(previous, retired=retired, rebuilt=[]))
+            return dict(previous, retired=retired, rebuilt=[])
+        manifest = {"version": version, "built_at": now, "states": states, "rebuilt": rebuilt,
+                    "retired": (published or {}).get("retired", {})}
+        # Shards the previous manifest used are retired as of now, and deleted only after the grace period
+        manifest["retired"] = _collect_garbage(kb_dir, manifest, now)
+        _publish(kb_dir, manifest)
+    logger.info("Published knowledge base %s (rebuilt: %s)", version[:16], ", ".join(rebuilt) or "none")
+    return manifest
+
+
+class KnowledgeBase:
+    """
+    Per-state sharded scheme knowledge base.
+
+    Only the manifest is read up front; a state's shard is opened (read-only,
+    memory-mapped) the first time a request needs that state.
+    """
+
+    def __init__(self, kb_dir: Path = KB_DIR):
+        self.kb_dir = Path(kb_dir)
+        self.manifest = json.loads((self.kb_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        self.version = self.manifest["version"]
+        self._shards: Dict[str, sqlite3.Connection] = {}
+        self._schemes: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def fingerprint(self) -> str:
+        return self.version
+
+    @property
+    def states(self) -> List[str]:
+        return sorted(self.manifest["states"])
+
+    def shard(self, state: str) -> Optional[sqlite3.Connection]:
+        state = normalize_state(state)
+        conn = self._shards.get(state)
+        if conn is not None:
+            return conn
+        info = self.manifest["states"].get(state)
+        if info is None:
+            return None
+        with self._lock:
+            conn = self._shards.get(state)
+            if conn is None:
+                path = self.kb_dir / info["file"]
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                conn.execute(f"PRAGMA mmap_size = {SHARD_MMAP_BYTES}")
+                self._shards[state] = conn
+        return conn
+
+    def loaded_states(self) -> List[str]:
+        return sorted(self._shards)
+
+    def close(self):
+        with self._lock:
+            for conn in self._shards.values():
+                conn.close()
+            self._shards.clear()
+
+    def search_states(self, state: Optional[str]) -> List[str]:
+        """States a question from this state draws on: its own shard plus central."""
+        if normalize_state(state):
+            return [s for s in (normalize_state(state), "central") if s in self.manifest["states"]]
+        return self.states
+
+    def search(self, query: str, state: Optional[str] = None, k: int = 5) -> List[Dict]:
+        """
+        Return the top-k chunks for the query, ranked by BM25.
+
+        Args:
+            query (str): The user's question
+            state (str): Restrict results to this state plus central schemes
+            k (int): Number of chunks to return
+
+        Returns:
+            List[Dict]: Chunks with state, title, text and score (higher is better)
+        """
+        # English glosses first: the corpus is mostly English, whatever language the question is in
+        terms = tokenize(gloss_query(query)) + [t for t in tokenize(query) if t not in INDIC_STOPWORDS]
+        terms = list(dict.fromkeys(terms))[:32]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        results = []
+        for state_key in self.search_states(state):
+            conn = self.shard(state_key)
+            rows = conn.execute(
+                "SELECT title, text, scheme_id, bm25(chunks) AS rank FROM chunks WHERE chunks MATCH ?"
+                " ORDER BY rank LIMIT ?",
+                (match, k),
+            ).fetchall()
+            for row in rows:
+                results.append({
+                    "state": state_key, "title": row["title"], "text": row["text"],
+                    "scheme_id": row["scheme_id"], "score": -row["rank"],
+                })
+        results.sort(key=lambda chunk: chunk["score"], reverse=True)
+        return results[:k]
+
+    def overview(self, state: Optional[str] = None, max_chars: int = MAX_CHUNK_CHARS * 2) -> List[Dict]:
+        """
+        The names and benefit amounts of the schemes a question from this state draws on, as chunks.
+
+        The state's own schemes come first, then central ones, up to max_chars in all.
+        """
+        chunks, remaining = [], max_chars
+        for state_key in self.search_states(state):
+            lines = []
+            for scheme in self.schemes(state_key):
+                line = f"- {scheme['name']}" + (f" (benefit: {scheme['benefit_amount']})" if scheme["benefit_amount"] else "")
+                if len(line) + 1 > remaining:
+                    break
+                lines.append(line)
+                remaining -= len(line) + 1
+            if lines:
+                chunks.append({"state": state_key, "title": "Schemes overview", "text": "\n".join(lines),
+                               "scheme_id": None, "score": 0.0})
+        return chunks
+
+    def schemes(self, state: str) -> List[Dict]:
+        """Structured records (without body text) for every scheme of a state."""
+        state = normalize_state(state)
+        if state not in self._schemes:
+            conn = self.shard(state)
+            if conn is None:
+                return []
+            rows = conn.execute(
+                "SELECT id, name, eligibility, benefit_amount, registration, criteria, source FROM schemes"
+            ).fetchall()
+            self._schemes[state] = [
+                dict(row, state=state, criteria=json.loads(row["criteria"] or "{}")) for row in rows
+            ]
+        return self._schemes[state]
+
+    def scheme_texts(self, state: str) -> List[Dict]:
+        """Full text of every scheme of a state, in format_chunks form, for whole-corpus prompts."""
+        conn = self.shard(state)
+        if conn is None:
+            return []
+        rows = conn.execute("SELECT name, body FROM schemes ORDER BY id").fetchall()
+        return [{"state": normalize_state(state), "title": row["name"], "text": row["body"]} for row in rows]
+
+    def find_scheme(self, name: str, state: Optional[str] = None) -> Optional[Dict]:
+        """
+        The scheme record a name refers to, searching the given state and central.
+
+        A search hit only counts if its title contains most of the name's
+        distinctive words; otherwise None, rather than some other scheme that
+        happens to share words with it.
+        """
+        wanted = _name_terms(name)
+        if not wanted:
+            return None
+        for hit in self.search(name, state=state, k=FIND_CANDIDATES):
+            title = set(_name_terms(hit["title"]))
+            if sum(term in title for term in wanted) < len(wanted) * MIN_NAME_MATCH:
+                continue
+            conn = self.shard(hit["state"])
+            row = conn.execute(
+                "SELECT id, name, eligibility, benefit_amount, registration, criteria, source, body"
+                " FROM schemes WHERE id = ?",
+                (hit["scheme_id"],),
+            ).fetchone()
+            if row is not None:
+                return dict(row, state=hit["state"], criteria=json.loads(row["criteria"] or "{}"))
+        return None
+
+
+_kb: Optional[KnowledgeBase] = None
+_kb_lock = threading.Lock()
+_next_check = 0.0
+
+
+def load_or_build(kb_dir: Path = KB_DIR) -> KnowledgeBase:
+    """Open the knowledge base, first rebuilding the states whose sources changed."""
+    build(kb_dir)
+    return KnowledgeBase(kb_dir)
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """
+    Return the process-wide knowledge base, opening it on first use.
+
+    Every RELOAD_CHECK_SECONDS the published manifest is checked, and a new
+    version (built by this or any other process) replaces the current one.
+    Requests already holding the previous one finish on it.
+    """
+    global _kb, _next_check
+    kb = _kb
+    if kb is not None and time.monotonic() < _next_check:
+        return kb
+    with _kb_lock:
+        if _kb is None:
+            _kb = load_or_build()
+        elif time.monotonic() >= _next_check:
+            manifest = read_manifest(_kb.kb_dir)
+            if manifest is not None and manifest.get("version") != _kb.version:
+                _kb = KnowledgeBase(_kb.kb_dir)
+                logger.info("Switched to knowledge base %s", _kb.version[:16])
+        _next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+        return _kb
+
+
+class CorpusWatcher:
+    """
+    Polls the corpus files and rebuilds the changed states when any of them changes.
+
+    Files are compared by mtime and size first, so an idle poll reads no
+    file contents; a touched but unchanged file costs one hash pass and
+    publishes nothing.
+
+    Args:
+        kb_dir (Path): The knowledge base to keep up to date
+        interval (float): Seconds between polls
+    """
+
+    def __init__(self, kb_dir: Path = KB_DIR, interval: float = 10.0):
+        self.kb_dir = kb_dir
+        self.interval = interval
+        # The first poll always hashes, in case a file changed before the watcher started
+        self.signature = None
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> Optional[Dict]:
+        """Rebuild if the sources changed since the last check; returns the new manifest if one was published."""
+        signature = sources_signature()
+        if signature == self.signature:
+            return None
+        manifest = build(self.kb_dir)
+        self.signature = signature
+        return manifest if manifest["rebuilt"] else None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning("Corpus refresh failed: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="corpus-watcher", daemon=True)
+            self._thread.start()
+
+
+_watcher: Optional[CorpusWatcher] = None
+
+
+def start_watcher() -> Optional[CorpusWatcher]:
+    """Start the process's corpus watcher; KB_WATCH_SECONDS sets the poll interval, 0 disables it."""
+    global _watcher
+    interval = float(os.getenv("KB_WATCH_SECONDS", "10"))
+    if interval <= 0:
+        return None
+    with _kb_lock:
+        if _watcher is None:
+            _watcher = CorpusWatcher(interval=interval)
+            _watcher.start()
+    return _watcher
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--full"]
+    target = Path(args[0]) if args else KB_DIR
+    manifest = build(target, full="--full" in sys.argv)
+    for state, info in manifest["states"].items():
+        status = "rebuilt" if state in manifest["rebuilt"] else "unchanged"
+        print(f"{state}: {info['schemes']} schemes, {info['chunks']} chunks, {status} -> {target / info['file']}")
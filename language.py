@@ -0,0 +1,156 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+# Language mappings for gTTS
+LANGUAGE_MAP = {
+    "en": {"name": "English", "gtts": "en-in"},
+    "hi": {"name": "Hindi", "gtts": "hi"},
+    "te": {"name": "Telugu", "gtts": "te"},
+    "kn": {"name": "Kannada", "gtts": "kn"},
+    "bn": {"name": "Bengali", "gtts": "bn"},
+    "gu": {"name": "Gujarati", "gtts": "gu"},
+    "ml": {"name": "Malayalam", "gtts": "ml"},
+    "mr": {"name": "Marathi", "gtts": "mr"},
+    "ta": {"name": "Tamil", "gtts": "ta"},
+    "ur": {"name": "Urdu", "gtts": "ur"}
+}
+
+# Unicode block -> language; Devanagari is shared by Hindi and Marathi
+SCRIPT_RANGES = [
+    (0x0900, 0x097F, "hi"),
+    (0x0980, 0x09FF, "bn"),
+    (0x0A80, 0x0AFF, "gu"),
+    (0x0B80, 0x0BFF, "ta"),
+    (0x0C00, 0x0C7F, "te"),
+    (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"),
+    (0x0600, 0x06FF, "ur"),
+]
+
+# Only this much of a reply is looked at; the language does not change halfway through
+SAMPLE_CHARS = 400
+
+# Words and letters common in Marathi but not in Hindi, and the other way round
+# (\b does not work here: Devanagari vowel signs are not word characters)
+_MARATHI_RE = re.compile(r"ळ|(?<![\u0900-\u0963])(?:आहे|आहेत|आणि|नाही|च्या|साठी|मध्ये|करा|तुम्ही)(?![\u0900-\u0963])")
+_HINDI_RE = re.compile(r"(?<![\u0900-\u0963])(?:है|हैं|में|के|की|नहीं|और|आप)(?![\u0900-\u0963])")
+
+
+def _script(ch: str) -> Optional[str]:
+    code = ord(ch)
+    for start, end, language in SCRIPT_RANGES:
+        if start <= code <= end:
+            return language
+    if ch.isascii() and ch.isalpha():
+        return "en"
+    return None
+
+
+def normalize_language(value) -> Optional[str]:
+    """Map a language hint like "hi", "Hindi" or "kn-IN" to a LANGUAGE_MAP code."""
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    code = value.split("-")[0].split("_")[0]
+    if code in LANGUAGE_MAP:
+        return code
+    for code, info in LANGUAGE_MAP.items():
+        if info["name"].lower() == value:
+            return code
+    return None
+
+
+def profile_language(user_profile) -> Optional[str]:
+    """The language the user asked for in their profile, if any."""
+    if not isinstance(user_profile, dict):
+        return None
+    for key in ("language", "preferred_language", "lang"):
+        language = normalize_language(user_profile.get(key))
+        if language:
+            return language
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _detect(sample: str, hint: Optional[str]) -> str:
+    counts = {}
+    for ch in sample:
+        language = _script(ch)
+        if language:
+            counts[language] = counts.get(language, 0) + 1
+    if not counts:
+        return hint or "en"
+    # Indic letters win over Latin ones: replies mix in English scheme names and numbers
+    indic = {language: n for language, n in counts.items() if language != "en"}
+    if not indic or sum(indic.values()) < 0.2 * counts.get("en", 0):
+        # English is the only Latin-script voice, so no statistical model is needed here
+        return "en"
+    language = max(indic, key=indic.get)
+    if language == "hi":
+        if _MARATHI_RE.search(sample):
+            return "mr"
+        if _HINDI_RE.search(sample):
+            return "hi"
+        return hint if hint == "mr" else "hi"
+    return language
+
+
+def detect_language(text: str, hint: Optional[str] = None) -> str:
+    """
+    Identify the language of a reply from the Unicode script of its first SAMPLE_CHARS characters.
+
+    Deterministic, unlike langdetect. The hint (from the user profile or the
+    transcript) settles Hindi vs Marathi when common words do not, and is
+    used when the text has no letters at all.
+
+    Returns:
+        str: A LANGUAGE_MAP code
+    """
+    sample = unicodedata.normalize("NFC", text or "")[:SAMPLE_CHARS]
+    return _detect(sample, normalize_language(hint))
+
+
+# Stems of common question words in Hindi, Marathi, Kannada, Telugu, Tamil and Malayalam, with the
+# English terms the scheme corpus uses; matched as substrings so inflected forms ("किसानों") count too
+QUERY_GLOSSARY = [
+    (("किसान", "शेतक", "कृषि", "कृषी", "ರೈತ", "ಕೃಷಿ", "రైతు", "వ్యవసాయ", "விவசாய", "கர்ஷக", "കർഷക", "കൃഷി"),
+     "farmer farmers agriculture kisan"),
+    (("योजना", "ಯೋಜನೆ", "పథక", "திட்ட", "പദ്ധതി"), "scheme yojana"),
+    (("प्रधानमंत्री", "प्रधान मंत्री", "पीएम", "ಪ್ರಧಾನ", "ప్రధాన", "பிரதம", "പ്രധാനമന്ത്രി"), "pradhan mantri pm"),
+    (("सम्मान निधि", "सन्मान निधी", "ಸಮ್ಮಾನ್", "సమ్మాన్", "சம்மான்", "സമ്മാൻ"), "samman nidhi"),
+    (("पेंशन", "पेन्शन", "ಪಿಂಚಣಿ", "పింఛన్", "పెన్షన్", "ஓய்வூதிய", "പെൻഷൻ"), "pension"),
+    (("आवास", "घर", "ಮನೆ", "ವಸತಿ", "ఇళ్ల", "ఇల్లు", "గృహ", "வீடு", "வீட்டு", "ഭവന", "വീട്"), "housing house awas"),
+    (("महिला", "स्त्री", "ಮಹಿಳ", "మహిళ", "பெண்", "സ്ത്രീ"), "women woman mahila"),
+    (("छात्र", "विद्यार्थ", "ಛಾತ್ರ", "ವಿದ್ಯಾರ್ಥಿ", "విద్యార్థి", "மாணவ", "വിദ്യാർത്ഥി"), "student students"),
+    (("छात्रवृत्ति", "शिष्यवृत्ती", "स्कॉलरशिप", "ವಿದ್ಯಾರ್ಥಿವೇತನ", "ఉపకార వేతన", "உதவித்தொகை", "സ്കോളർഷിപ്പ്"), "scholarship"),
+    (("आवेदन", "अर्ज", "ಅರ್ಜಿ", "దరఖాస్తు", "விண்ணப்ப", "അപേക്ഷ"), "apply application registration"),
+    (("दस्तावेज", "कागज", "कागदपत्र", "ದಾಖಲೆ", "పత్రాలు", "ஆவண", "രേഖ"), "documents"),
+    (("वृद्ध", "बुजुर्ग", "वरिष्ठ", "ज्येष्ठ", "ಹಿರಿಯ", "వృద్ధ", "முதிய", "വയോ"), "senior citizens old age"),
+    (("ऋण", "कर्ज", "लोन", "ಸಾಲ", "రుణ", "கடன்", "വായ്പ"), "loan"),
+    (("बीमा", "विमा", "ವಿಮೆ", "బీమా", "காப்பீடு", "ഇൻഷുറൻസ്"), "insurance bima"),
+    (("स्वास्थ्य", "आरोग्य", "इलाज", "ಆರೋಗ್ಯ", "ఆరోగ్య", "சுகாதார", "ആരോഗ്യ"), "health treatment"),
+    (("विवाह", "शादी", "लग्न", "ಮದುವೆ", "ವಿವಾಹ", "వివాహ", "పెళ్లి", "திருமண", "വിവാഹ"), "marriage vivah"),
+    (("राशन", "रेशन", "ಪಡಿತರ", "రేషన్", "ரேஷன்", "റേഷൻ"), "ration"),
+    (("मदद", "सहायता", "आर्थिक", "ಸಹಾಯ", "ಆರ್ಥಿಕ", "సహాయ", "ఆర్థిక", "உதவி", "സഹായ"), "assistance financial"),
+    (("फसल", "पीक", "ಬೆಳೆ", "పంట", "பயிர்", "വിള"), "crop"),
+    (("मजदूर", "श्रमिक", "कामगार", "ಕಾರ್ಮಿಕ", "కార్మిక", "தொழிலாளர்", "തൊഴിലാളി"), "labour workers"),
+    (("बुनकर", "विणकर", "ನೇಕಾರ", "చేనేత", "நெசவ", "നെയ്ത്ത"), "weaver handloom"),
+    (("मछुआ", "मच्छीमार", "ಮೀನುಗಾರ", "మత్స్యకార", "மீனவ", "മത്സ്യത്തൊഴിലാളി"), "fishermen fisheries"),
+    (("रोजगार", "नौकरी", "ಉದ್ಯೋಗ", "ఉపాధి", "வேலைவாய்ப்பு", "തൊഴിൽ"), "employment jobs"),
+]
+
+# Hindi and Marathi function words; searched for, they match every Devanagari chunk in the corpus
+INDIC_STOPWORDS = {
+    "में", "को", "की", "के", "का", "है", "हैं", "हर", "से", "पर", "और", "या", "क्या", "कैसे", "कितनी", "कितना",
+    "कौन", "सी", "लिए", "मिलती", "मिलता", "होता", "होती", "यह", "वह", "मैं", "मुझे", "हम", "आप", "कर", "करें",
+    "करना", "साल", "भी", "तो", "ही", "एक", "आहे", "आहेत", "आणि", "कसा", "कसे", "करायचा", "कोणत्या", "मध्ये",
+    "ची", "चा", "चे", "ते", "मी", "तुम्ही", "सरकारी", "सरकार",
+}
+
+
+def gloss_query(text: str) -> str:
+    """English corpus terms for the Indian-language words in a question, so they can be searched."""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(english for stems, english in QUERY_GLOSSARY if any(stem in text for stem in stems))
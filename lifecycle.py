@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Failed components are retried with this backoff, capped at the last value
+RETRY_DELAYS = (2, 5, 15, 30, 60)
+
+
+class Warmup:
+    """
+    Loads slow components in a background thread so the server starts serving at once.
+
+    The components are still loaded lazily on first use, so a request that
+    arrives early just waits for what it needs. Components that fail are
+    retried with backoff until they load.
+
+    Args:
+        components (Dict[str, Callable]): Name -> loader, run in order
+    """
+
+    def __init__(self, components: Dict[str, Callable[[], Any]]):
+        self.components = components
+        self.status = {name: "pending" for name in components}
+        self.seconds: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def _load(self, name: str) -> bool:
+        self.status[name] = "loading"
+        started = time.perf_counter()
+        try:
+            self.components[name]()
+        except Exception as e:
+            self.status[name] = "failed"
+            self.errors[name] = str(e)
+            logger.warning("Warm-up of %s failed: %s", name, e)
+            return False
+        self.seconds[name] = round(time.perf_counter() - started, 3)
+        self.status[name] = "ready"
+        self.errors.pop(name, None)
+        return True
+
+    def _run(self):
+        pending = [name for name in self.components if not self._load(name)]
+        attempt = 0
+        while pending:
+            time.sleep(RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)])
+            attempt += 1
+            pending = [name for name in pending if not self._load(name)]
+
+    @property
+    def ready(self) -> bool:
+        return all(status == "ready" for status in self.status.values())
+
+    def report(self) -> Dict:
+        return {"ready": self.ready, "components": dict(self.status), "seconds": dict(self.seconds),
+                "errors": dict(self.errors)}
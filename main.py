@@ -1,125 +1,602 @@
 from fastapi import FastAPI
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Header, Request
 from google.generativeai import GenerativeModel, configure
 from pathlib import Path
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import argparse
-from gtts import gTTS
 import os
-from langdetect import detect
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 import json
-import pandas as pd
+from retrieval import retrieve_context, get_index
+from knowledge_base import start_watcher
+from eligibility import MIN_CONFIRMED_SCHEMES, is_eligibility_question, eligible_schemes, format_eligible
+from language import LANGUAGE_MAP, detect_language, profile_language
+from market import market_context, get_market_store
+from market_history import get_market_history, trend_context
+from sessions import SessionManager
+from shared_store import worker_shared_store
+from pipeline import Pipeline, Overloaded, StageTimeout
+from streaming import iter_sentences, stream_speech
+from tts_cache import get_tts_cache
+from answer_cache import get_answer_cache, corpus_version
+from stt_backends import get_stt_backend
+from batch import FAQ_PATH, BatchRunner, faq_answer, get_context_cache, load_faq_answers, load_items, precompute_faq
+from audio_codec import REPLY_FORMATS, choose_reply_format, encode_reply, normalize_for_stt
+from gemini_client import GeminiUnavailable, call_gemini, generative_model, get_caller, request_options
+import metrics
+from lifecycle import Warmup
+from metrics import RequestTrace, annotate, log_event, observe_stage, record_usage, span
+import asyncio
+import io
+import logging
+import mimetypes
+import threading
+import time
+import uuid
 
 load_dotenv()
+# Request logs are single JSON lines (see metrics.log_event)
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 app = FastAPI()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model=genai.GenerativeModel('gemini-2.0-flash')
-chat = model.start_chat(history=[])
+
+# Built on first use (or by the startup warm-up) rather than at import
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """The shared Gemini model used for speech-to-text."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = generative_model()
+    return _model
+
+SYSTEM_PROMPT = """You are a helpful assistant that provides information about various government schemes, market prices and digital literacy from different states in India. 
+    Use the context given with each question and your knowledge to answer questions about these schemes. Provide a very clean output without any special characters. Also give relevant information according to the user profile. Refer to the market prices of commodities in different regions, and to their price trends, when they are given with the question.
+    User Profile:
+    {user_profile}
+    """
+
+def create_chat(user_profile):
+    """Start a chat whose system prompt carries the user's profile, sent once per session."""
+    session_model = generative_model(SYSTEM_PROMPT.format(user_profile=user_profile))
+    return session_model.start_chat(history=[])
+
+sessions = SessionManager(
+    create_chat,
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "1800")),
+    max_history_tokens=int(os.getenv("SESSION_HISTORY_TOKENS", "8000")),
+    on_response=record_usage,
+    # Every chat turn goes through the shared rate limiter, retries and circuit breaker
+    call=call_gemini,
+    # With a shared store (SHARED_STORE_URL) a session can continue on any worker
+    store=worker_shared_store(),
+)
+
+pipeline = Pipeline(
+    max_concurrency=int(os.getenv("MAX_CONCURRENT_REQUESTS", "8")),
+    timeouts={
+        "stt": float(os.getenv("STT_TIMEOUT", "30")),
+        "llm": float(os.getenv("LLM_TIMEOUT", "60")),
+        "tts": float(os.getenv("TTS_TIMEOUT", "30")),
+    },
+)
+
+metrics.register_gauge("answer_cache_hit_ratio", "Share of answer cache lookups that were hits.",
+                       lambda: get_answer_cache().stats()["hit_ratio"])
+metrics.register_gauge("tts_cache_hit_ratio", "Share of TTS cache lookups that were hits.",
+                       lambda: get_tts_cache().stats()["hit_ratio"])
+metrics.register_gauge("voice_requests_in_flight", "Voice requests holding a pipeline slot.", lambda: pipeline.active)
+metrics.register_gauge("chat_sessions", "Chat sessions held in memory.", lambda: len(sessions))
+metrics.register_gauge("gemini_circuit_open", "1 while the Gemini circuit breaker refuses calls.",
+                       lambda: get_caller().breaker.state == "open")
+metrics.register_gauge("gemini_retries", "Gemini calls retried after a transient error.", lambda: get_caller().retries)
+
+# The index, price table, model and caches load in the background once the server is up
+warmup = Warmup({
+    "knowledge_base": get_index,
+    # Rebuilds changed states in the background; new versions are picked up by get_index
+    "corpus_watcher": start_watcher,
+    "market": get_market_store,
+    "market_history": get_market_history,
+    "model": get_model,
+    "stt": lambda: get_stt_backend(get_model()),
+    "tts_cache": get_tts_cache,
+    "answer_cache": get_answer_cache,
+    "faq_answers": load_faq_answers,
+    # /batch and /batch/faq runs share its registered corpus prefixes
+    "context_cache": get_context_cache,
+})
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
+
+@app.on_event("shutdown")
+def shutdown_pipeline():
+    pipeline.shutdown()
+
+def resolve_session_id(session_id, user_profile):
+    """Use the explicit session id, else a stable id from the profile, else a fresh one."""
+    if session_id:
+        return session_id
+    if isinstance(user_profile, dict):
+        for key in ("session_id", "user_id", "id", "phone"):
+            if user_profile.get(key):
+                return str(user_profile[key])
+    return uuid.uuid4().hex
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to FastAPI!"}
 
-@app.post("/chat")
-async def govt_scheme(file: UploadFile = File(...),user_profile_json: str = Form(...)):
-    print("came")
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: everything a request needs has been loaded."""
+    report = warmup.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/cache/tts")
+def tts_cache_stats():
+    return get_tts_cache().stats()
+
+@app.get("/cache/answers")
+def answer_cache_stats():
+    return get_answer_cache().stats()
+
+# Items of one /batch request answered at the same time
+MAX_BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+@app.post("/batch")
+async def batch(request: Request, concurrency: int = MAX_BATCH_CONCURRENCY):
+    """
+    Answer a JSONL body of {"id", "question", "profile"} items without audio.
+
+    Items are grouped by state so each state's context is sent once; results
+    stream back as JSONL, one line per item.
+    """
     try:
-        user_profile = json.loads(user_profile_json)
-    except json.JSONDecodeError as e:
-        return {"error": "Invalid user profile JSON", "details": str(e)}
-    file_path = f"temp_{file.filename}"
-    
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+        items = load_items((await request.body()).decode("utf-8").splitlines())
+    except (UnicodeDecodeError, ValueError) as e:
+        return JSONResponse({"error": "Invalid batch input", "details": str(e)}, status_code=400)
+    runner = BatchRunner(concurrency=max(1, min(concurrency, MAX_BATCH_CONCURRENCY)))
+    lines = (json.dumps(result, ensure_ascii=False) + "\n" for result in runner.iter_results(items))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@app.post("/batch/faq")
+async def batch_faq(states: str = None, languages: str = None):
+    """Precompute the curated FAQ answers (comma-separated states and languages, default all) into the answer store."""
+    return await asyncio.to_thread(
+        precompute_faq, FAQ_PATH,
+        states.split(",") if states else None,
+        languages.split(",") if languages else None,
+        MAX_BATCH_CONCURRENCY,
+    )
 
-    print(f"File saved at: {file_path}")
+@app.get("/stats/gemini")
+def gemini_stats():
+    return get_caller().stats()
+
+@app.get("/stats/pipeline")
+def pipeline_stats():
+    return pipeline.latency_stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage latencies, token counts and cache hit ratios in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/chat")
+async def govt_scheme(file: UploadFile = File(...),user_profile_json: str = Form(...),session_id: str = Form(None),stream: bool = Form(False),mode: str = Form("two-call"),audio_format: str = Form(None),accept: str = Header(None)):
+    """
+    Answer a spoken question with spoken audio.
+
+    mode="two-call" transcribes first and then answers (stream=true streams the
+    reply sentence by sentence); mode="single-call" sends the audio straight to
+    the model, which returns transcript and answer together.
+
+    The reply is low-bitrate Opus for clients that accept audio/ogg (or ask
+    with audio_format="opus"), otherwise speech-tuned MP3; audio_format="original"
+    returns gTTS's MP3 as it is. Streamed replies are always gTTS's MP3.
+    """
+    reply_format = choose_reply_format(audio_format, accept)
+    trace = RequestTrace("stream" if stream and mode != "single-call" else mode)
+    with trace.activate():
+        log_event("request_received", mode=trace.mode)
+        try:
+            user_profile = json.loads(user_profile_json)
+        except json.JSONDecodeError as e:
+            trace.finish("bad_request")
+            return {"error": "Invalid user profile JSON", "details": str(e)}
+        session_id = resolve_session_id(session_id, user_profile)
+        if trace.mode == "stream":
+            # Ogg pages cannot be cut per sentence, and an ffmpeg run per sentence would delay
+            # the first audio, so streams send gTTS's MP3 as it is
+            return await stream_voice_pipeline(file, user_profile, session_id, trace)
+        try:
+            async with pipeline.slot():
+                if mode == "single-call":
+                    response = await run_single_call_pipeline(file, user_profile, session_id, trace, reply_format)
+                else:
+                    response = await run_voice_pipeline(file, user_profile, session_id, trace, reply_format)
+        except Overloaded as e:
+            trace.finish("overloaded")
+            return JSONResponse({"error": "Server busy, please retry", "details": str(e)}, status_code=503, headers={"Retry-After": "2"})
+        except StageTimeout as e:
+            trace.finish("timeout")
+            return JSONResponse({"error": f"{e.stage} stage timed out", "details": str(e)}, status_code=504)
+        except GeminiUnavailable as e:
+            trace.finish("unavailable")
+            return JSONResponse({"error": "Model unavailable, please retry", "details": str(e)}, status_code=503, headers={"Retry-After": "5"})
+        except Exception:
+            trace.finish("error")
+            raise
+        trace.finish()
+        return response
+
+async def run_voice_pipeline(file, user_profile, session_id, trace, reply_format=None):
+    """STT -> LLM -> TTS, with every blocking stage on the worker pool."""
+    # The upload and the reply stay in memory, so concurrent requests never share a file
+    audio, mime_type = await prepare_audio(file)
     
-    text = stt(file_path)
-    print(f"Transcript: {text}")
+    with span("stt"):
+        text = await pipeline.run("stt", stt, audio, mime_type)
+    log_event("transcript", text=text)
     
-    reply = llmcall(text,user_profile)
-    print(f"LLM Response: {reply}")
+    # Context assembly and the LLM call are timed inside llmcall
+    reply = await pipeline.run("llm", llmcall, text, user_profile, session_id)
+    log_event("llm_response", text=reply)
     
-    tts = text_to_speech(reply, language=detect_language(reply), output_file="response.mp3")
+    # Language detection is CPU-bound too, so it runs with TTS on the pool
+    speech, media_type = await pipeline.run("tts", speak, reply, reply_language_hint(user_profile, text), reply_format)
+
+    return audio_response(speech, media_type, session_id, "two-call", trace)
 
-    return FileResponse("response.mp3", media_type="audio/mpeg", filename="response.mp3")
-def stt(file):
+async def run_single_call_pipeline(file, user_profile, session_id, trace, reply_format=None):
+    """Audio + context -> one LLM call returning transcript and answer -> TTS."""
+    audio, mime_type = await prepare_audio(file)
     
-    myfile = genai.upload_file(path=file)
-    prompt = 'Generate a transcript of the speech.'
-    response = model.generate_content([prompt, myfile])
-    return response.text
-
-def llmcall(question,user_profile):
-    """Create and return a chat instance with context."""
-    context = ""
-    # base_path = Path("state")
+    text, reply = await pipeline.run("llm", audio_llmcall, audio, mime_type, user_profile, session_id)
+    log_event("transcript", text=text)
+    log_event("llm_response", text=reply)
     
-    # states = ["andhra-pradesh", "karnataka", "kerala", "tamilnadu", "telangana", "central"]
+    speech, media_type = await pipeline.run("tts", speak, reply, reply_language_hint(user_profile, text), reply_format)
+
+    return audio_response(speech, media_type, session_id, "single-call", trace)
+
+async def prepare_audio(file):
+    """Read the upload and shrink it for speech-to-text: 16 kHz mono, silence trimmed."""
+    with span("upload"):
+        audio, mime_type = await read_upload(file)
+    with span("normalize"):
+        return await pipeline.run("stt", normalize_for_stt, audio, mime_type)
+
+def reply_language_hint(user_profile, transcript):
+    """The language the reply should be in: the profile's choice, else the language the user spoke."""
+    return profile_language(user_profile) or (detect_language(transcript) if transcript else None)
+
+def speak(reply, hint=None, reply_format=None):
+    """Detect the reply's language once, synthesize it and encode it; returns (audio, media type)."""
+    with span("langdetect"):
+        language = detect_language(reply, hint)
+    with span("tts"):
+        return synthesize_speech(reply, language, reply_format)
+
+def audio_response(speech, media_type, session_id, mode, trace):
+    """Return the reply audio and record the request's latency for its pipeline mode."""
+    pipeline.observe(mode, trace.elapsed)
+    extension = "ogg" if media_type == "audio/ogg" else "mp3"
+    return Response(speech, media_type=media_type, headers={
+        "X-Session-Id": session_id,
+        "X-Request-Id": trace.request_id,
+        "X-Pipeline-Mode": mode,
+        "Server-Timing": trace.server_timing(),
+        "Content-Disposition": f'attachment; filename="response.{extension}"',
+    })
+
+async def stream_voice_pipeline(file, user_profile, session_id, trace, reply_format=None):
+    """Like run_voice_pipeline, but streams MP3 audio one sentence at a time."""
+    try:
+        pipeline.acquire()
+    except Overloaded as e:
+        trace.finish("overloaded")
+        return JSONResponse({"error": "Server busy, please retry", "details": str(e)}, status_code=503, headers={"Retry-After": "2"})
+    try:
+        audio, mime_type = await prepare_audio(file)
+        with span("stt"):
+            text = await pipeline.run("stt", stt, audio, mime_type)
+        log_event("transcript", text=text)
+    except StageTimeout as e:
+        pipeline.release()
+        trace.finish("timeout")
+        return JSONResponse({"error": f"{e.stage} stage timed out", "details": str(e)}, status_code=504)
+    except GeminiUnavailable as e:
+        pipeline.release()
+        trace.finish("unavailable")
+        return JSONResponse({"error": "Model unavailable, please retry", "details": str(e)}, status_code=503, headers={"Retry-After": "5"})
+    except BaseException:
+        pipeline.release()
+        trace.finish("error")
+        raise
+
+    speaker = SentenceSpeaker(reply_language_hint(user_profile, text), reply_format)
+    speech = stream_speech(iter_sentences(llm_stream(text, user_profile, session_id)), speaker)
+
+    async def body():
+        # The request keeps its slot until the last sentence has been sent
+        status = "error"
+        with trace.activate():
+            try:
+                async for chunk in pipeline.iterate("llm", speech):
+                    if "first_audio_seconds" not in trace.attributes:
+                        annotate(first_audio_seconds=round(trace.elapsed, 4))
+                    yield chunk
+                status = "ok"
+            except StageTimeout as e:
+                status = "timeout"
+                log_event("stream_stopped", error=str(e))
+            finally:
+                pipeline.release()
+                trace.finish(status)
+
+    return StreamingResponse(body(), media_type="audio/mpeg", headers={
+        "X-Session-Id": session_id,
+        "X-Request-Id": trace.request_id,
+    })
+
+async def read_upload(file):
+    """Return the uploaded audio bytes and their MIME type."""
+    audio = await file.read()
+    mime_type = file.content_type
+    if not mime_type or mime_type == "application/octet-stream":
+        mime_type = mimetypes.guess_type(file.filename or "")[0] or "audio/mpeg"
+    return audio, mime_type
+
+def stt(audio, mime_type="audio/mpeg"):
+    """Transcribe audio bytes with the configured backend (STT_BACKEND)."""
+    return get_stt_backend(get_model()).transcribe(audio, mime_type)
+
+def build_message(question,user_profile):
+    """Put the context retrieved for this question in front of it."""
+    state = user_profile.get("state") if isinstance(user_profile, dict) else None
+    if isinstance(user_profile, dict) and is_eligibility_question(question):
+        schemes = eligible_schemes(get_index(), user_profile)
+        if len(schemes) >= MIN_CONFIRMED_SCHEMES:
+            # The rules engine has already picked the schemes; the LLM only has to phrase them
+            context = format_eligible(schemes)
+        else:
+            # Too few schemes confirmed: chunks matching the profile, minus schemes it is ruled out of
+            context = retrieve_context(profile_query(user_profile), state=state, user_profile=user_profile)
+    else:
+        # Only the chunks relevant to this question, for schemes the user is not ruled out of
+        context = retrieve_context(question, state=state, user_profile=user_profile)
     
-    # for state in states:
-    #     combined_file = base_path / f"{state}_combined.txt"
-    #     if combined_file.exists():
-    #         with open(combined_file, 'r', encoding='utf-8') as f:
-    #             context += f"\n\n=== {state.upper()} SCHEMES ===\n"
-    #             context += f.read()
-    # print(context)
-    # output_file = Path("state") / "all_states_combined.txt"
-    # with open(output_file, 'w', encoding='utf-8') as out_f:
-    #     out_f.write(context)
-    with open("context.txt",'r',encoding='utf-8') as f:
-        context+=f.read()
+    # Only the price rows for commodities and places named in the question
+    market = market_context(question, user_profile)
+    # 7/30-day averages and % change, so "is the price going up" needs no raw history
+    trends = trend_context(question, user_profile)
+    annotate(context_chars=len(context) + len(market) + len(trends))
     
-    df=pd.read_csv("market_price.csv")
-    data_list = df.to_dict('records')
-    market = str(data_list)
+    return f"""Context:
+    {context}
+    Market prices:
+    {market}
+    Price trends:
+    {trends}
+    Question: {question}
+    """
+
+def eligibility_answer(question, user_profile):
+    """Answer "which schemes am I eligible for" from the rules engine, or None if the LLM is needed."""
+    if not isinstance(user_profile, dict) or not is_eligibility_question(question):
+        return None
+    # The rules engine answers in English; other languages still go through the LLM
+    if detect_language(question) != "en":
+        return None
+    schemes = eligible_schemes(get_index(), user_profile)
+    # With only one or two schemes confirmed the list would mislead; the LLM answers from the context
+    if len(schemes) < MIN_CONFIRMED_SCHEMES:
+        return None
+    return format_eligible(schemes)
+
+def cached_answer(question, user_profile, version):
+    """A cached answer to an opening question, including the precomputed FAQ answers."""
+    # Answers precomputed for the state's FAQ (see batch.py) do not depend on the rest of the profile
+    return get_answer_cache().get(question, user_profile, version) or faq_answer(question, user_profile, version)
+
+def answer_without_llm(question, user_profile, session_id):
+    """
+    Answer from the rules engine or the caches, recording it in the session.
+
+    Returns (answer, version, cacheable): answer is None when the LLM is
+    needed, and cacheable says whether its reply may go in the answer cache
+    under version.
+    """
+    with span("context"):
+        answer = eligibility_answer(question, user_profile)
+    if answer is not None:
+        annotate(answer_source="rules")
+        sessions.record(session_id, question, answer, user_profile)
+        return answer, None, False
     
+    version = corpus_version()
+    # Follow-ups ("how do I apply?") depend on the conversation, so only a session's first question is cached
+    cacheable = not sessions.has_history(session_id, user_profile)
+    cached = cached_answer(question, user_profile, version) if cacheable else None
+    if cached is not None:
+        annotate(answer_source="cache")
+        sessions.record(session_id, question, cached, user_profile)
+    return cached, version, cacheable
+
+def llmcall(question,user_profile,session_id):
+    """Answer the question in the user's session with context retrieved for it."""
+    answer, version, cacheable = answer_without_llm(question, user_profile, session_id)
+    if answer is not None:
+        return answer
     
-    system_prompt = f"""You are a helpful assistant that provides information about various government schemes, market prices and digital literacy from different states in India. 
-    Use the following context and your knowledge to answer questions about these schemes. Provide a very clean output without any special characters. Also give relevant information according to the user profile. Refer to marker prices of different commodities in different regions in this file {market}
-    User Profile:
-    {user_profile}
+    with span("context"):
+        message = build_message(question, user_profile)
+    # The system prompt is set once per session; history keeps just the question
+    with span("llm"):
+        reply = sessions.send(session_id, message, user_profile=user_profile, history_message=question,
+                              request_options=request_options())
+    annotate(answer_source="llm")
+    if cacheable:
+        get_answer_cache().put(question, reply, user_profile, version)
+    return reply
+
+AUDIO_PROMPT = """The attached audio is the user's question. Transcribe it, then answer it.
+    Reply only with JSON of the form {{"transcript": "...", "answer": "..."}}, with the answer in the language the user spoke.
     Context:
     {context}
     """
-    
-    chat.send_message(system_prompt)
-    response = chat.send_message(question)
-    return response.text
-
-LANGUAGE_MAP = {
-    "en": {"name": "English", "gtts": "en-in"},
-    "hi": {"name": "Hindi", "gtts": "hi"},
-    "te": {"name": "Telugu", "gtts": "te"},
-    "kn": {"name": "Kannada", "gtts": "kn"},
-    "bn": {"name": "Bengali", "gtts": "bn"},
-    "gu": {"name": "Gujarati", "gtts": "gu"},
-    "ml": {"name": "Malayalam", "gtts": "ml"},
-    "mr": {"name": "Marathi", "gtts": "mr"},
-    "ta": {"name": "Tamil", "gtts": "ta"},
-    "ur": {"name": "Urdu", "gtts": "ur"}
-}
-
-def detect_language(text):
+
+def profile_query(user_profile):
+    """Retrieval query built from the profile, for when the question is not known yet."""
+    if not isinstance(user_profile, dict):
+        return "scheme eligibility benefits"
+    facets = [str(user_profile[k]) for k in ("occupation", "gender", "caste", "state", "district") if user_profile.get(k)]
+    return " ".join(facets + ["scheme eligibility benefits"])
+
+def parse_audio_reply(reply):
+    """Split the single-call JSON reply into (transcript, answer)."""
     try:
-        lang = detect(text)
-        return lang if lang in LANGUAGE_MAP else "en"
-    except:
-        return "en"
+        data = json.loads(reply)
+        return str(data.get("transcript", "")), str(data.get("answer", ""))
+    except (json.JSONDecodeError, AttributeError):
+        return "", reply
+
+def audio_llmcall(audio, mime_type, user_profile, session_id):
+    """Transcribe and answer in one LLM call; returns (transcript, answer)."""
+    state = user_profile.get("state") if isinstance(user_profile, dict) else None
+    # The question is still audio, so context is retrieved for the user's profile
+    with span("context"):
+        context = retrieve_context(profile_query(user_profile), state=state, user_profile=user_profile)
+    cacheable = not sessions.has_history(session_id, user_profile)
+    with span("llm"):
+        reply = sessions.send(
+            session_id,
+            [AUDIO_PROMPT.format(context=context), {"mime_type": mime_type, "data": audio}],
+            user_profile=user_profile,
+            # Keep the transcript and answer in history, not the audio or the JSON
+            history_message=parse_audio_reply,
+            generation_config={"response_mime_type": "application/json"},
+            request_options=request_options(),
+        )
+    annotate(answer_source="llm")
+    text, answer = parse_audio_reply(reply)
+    if text and cacheable:
+        get_answer_cache().put(text, answer, user_profile, corpus_version())
+    return text, answer
+
+def llm_stream(question,user_profile,session_id):
+    """Like llmcall, but yields the reply text as the model streams it."""
+    answer, version, cacheable = answer_without_llm(question, user_profile, session_id)
+    if answer is not None:
+        yield answer
+        return
+    
+    with span("context"):
+        message = build_message(question, user_profile)
+    annotate(answer_source="llm")
+    pieces = []
+    # Only time spent waiting on the model counts, not the TTS done between pieces
+    llm_seconds = 0.0
+    chunks = sessions.stream(session_id, message, user_profile=user_profile, history_message=question,
+                             request_options=request_options())
+    while True:
+        waited = time.perf_counter()
+        piece = next(chunks, None)
+        llm_seconds += time.perf_counter() - waited
+        if piece is None:
+            break
+        pieces.append(piece)
+        yield piece
+    observe_stage("llm", llm_seconds)
+    if cacheable:
+        get_answer_cache().put(question, "".join(pieces), user_profile, version)
 
 def text_to_speech(text, language=None, output_file="output2.mp3"):
-    lang_code = LANGUAGE_MAP[language]["gtts"] if language in LANGUAGE_MAP else LANGUAGE_MAP[detect_language(text)]["gtts"]
-    lang_name = LANGUAGE_MAP.get(language, LANGUAGE_MAP[detect_language(text)])["name"]
+    if language not in LANGUAGE_MAP:
+        language = detect_language(text)
+    lang_code = LANGUAGE_MAP[language]["gtts"]
+    lang_name = LANGUAGE_MAP[language]["name"]
     print(f"Converting text to speech in {lang_name}...")
     
-    tts = gTTS(text=text, lang=lang_code)
+    audio = get_tts_cache().get_or_synthesize(text, lang_code, gtts_bytes)
     
-    tts.save(output_file)
+    with open(output_file, "wb") as f:
+        f.write(audio)
     print('saved')
     
     # return tts
 
+def gtts_bytes(text, lang_code):
+    """Run gTTS and return the MP3 bytes without touching the disk."""
+    # Imported here so the server does not pay for gTTS at startup
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang_code).write_to_fp(buffer)
+    return buffer.getvalue()
+
+def synthesize_speech(text, language, reply_format=None):
+    """
+    Return the reply audio and its media type, from the TTS cache when the text has been spoken before.
+
+    Audio re-encoded for a reply format is cached too, so ffmpeg runs once per
+    text and format rather than on every reply.
+    """
+    lang = LANGUAGE_MAP[language]["gtts"]
+    cache = get_tts_cache()
+    if reply_format not in REPLY_FORMATS:
+        return cache.get_or_synthesize(text, lang, gtts_bytes), "audio/mpeg"
+    encoded = cache.get(text, lang, reply_format)
+    if encoded is not None:
+        return encoded, REPLY_FORMATS[reply_format][0]
+    speech = cache.get_or_synthesize(text, lang, gtts_bytes)
+    with span("encode"):
+        encoded, media_type = encode_reply(speech, reply_format)
+    # Not cached when ffmpeg is missing or failed and gTTS's MP3 came back
+    if encoded is not speech:
+        cache.put(text, lang, encoded, reply_format)
+    return encoded, media_type
+
+class SentenceSpeaker:
+    """Synthesizes streamed sentences in the language of the first one, so the voice does not flip mid-reply."""
+
+    def __init__(self, hint=None, reply_format=None):
+        self.hint = hint
+        self.reply_format = reply_format
+        self.language = None
+
+    def __call__(self, sentence):
+        if self.language is None:
+            with span("langdetect"):
+                self.language = detect_language(sentence, self.hint)
+        with span("tts_sentence"):
+            return synthesize_speech(sentence, self.language, self.reply_format)[0]
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the voice assistant API.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    # Workers share the knowledge base shards and market snapshot through the page cache;
+    # set SHARED_STORE_URL=redis://... so they also share sessions and caches
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args()
+    if args.workers > 1 and not worker_shared_store():
+        logging.warning("Running %d workers without SHARED_STORE_URL: sessions and answer caches are per worker",
+                        args.workers)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
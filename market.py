@@ -0,0 +1,372 @@
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+MARKET_FILE = BASE_DIR / "market_price.csv"
+# Binary column snapshots of the CSV, memory-mapped by every worker process
+SNAPSHOT_DIR = Path(os.getenv("MARKET_SNAPSHOT_DIR", BASE_DIR / ".cache" / "market"))
+# Bumped whenever the snapshot layout changes
+SNAPSHOT_FORMAT = 1
+# Snapshots of older CSV versions are deleted once this old
+SNAPSHOT_GRACE_SECONDS = 600
+
+KEY_COLUMNS = ["State", "District", "Market", "Commodity"]
+LABEL_COLUMNS = KEY_COLUMNS + ["Variety", "Grade"]
+PRICE_COLUMNS = ["Min Price", "Max Price", "Modal Price"]
+
+# Most rows that get pasted into a prompt for one question
+MAX_PROMPT_ROWS = 40
+
+# Parenthesised qualifiers that are too generic to identify a commodity on their own
+_GENERIC_ALIASES = {"whole", "loose", "other", "local", "split", "dal", "raw", "dry", "fine"}
+
+
+def _aliases(label: str) -> List[str]:
+    """Names a label can be referred to by, e.g. "Green Gram (Moong)(Whole)" -> green gram, moong."""
+    label = label.lower().strip()
+    aliases = {label}
+    for part in re.split(r"[()]", label):
+        part = part.strip(" .,-")
+        if len(part) > 2 and part not in _GENERIC_ALIASES:
+            aliases.add(part)
+    return sorted(aliases)
+
+
+def parse_csv(path: Path) -> Tuple[Dict[str, List[str]], Dict[str, array], Dict[str, array]]:
+    """Read the CSV into label tables, label-code columns and price columns."""
+    labels = {col: [] for col in LABEL_COLUMNS}
+    lookup = {col: {} for col in LABEL_COLUMNS}
+    codes = {col: array("I") for col in LABEL_COLUMNS}
+    prices = {col: array("d") for col in PRICE_COLUMNS}
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for col in LABEL_COLUMNS:
+                value = row[col].strip()
+                code = lookup[col].get(value)
+                if code is None:
+                    code = lookup[col][value] = len(labels[col])
+                    labels[col].append(value)
+                codes[col].append(code)
+            for col in PRICE_COLUMNS:
+                try:
+                    prices[col].append(float(row[col]))
+                except (TypeError, ValueError):
+                    prices[col].append(float("nan"))
+    return labels, codes, prices
+
+
+def build_postings(codes: array, label_count: int) -> Tuple[array, array]:
+    """
+    Row ids grouped by label code: rows of code c are postings[starts[c]:starts[c + 1]].
+
+    Row ids within a code stay in ascending order.
+    """
+    starts = array("I", [0] * (label_count + 1))
+    for code in codes:
+        starts[code + 1] += 1
+    for code in range(label_count):
+        starts[code + 1] += starts[code]
+    fill = array("I", starts[:-1])
+    postings = array("I", [0] * len(codes))
+    for row_id, code in enumerate(codes):
+        postings[fill[code]] = row_id
+        fill[code] += 1
+    return postings, starts
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_snapshot(path: Path, labels: Dict[str, List[str]], codes: Dict[str, array], prices: Dict[str, array]):
+    """
+    Write the columns and postings to one file: an 8-byte header length, a
+    JSON header (labels and block offsets), then 8-byte aligned arrays.
+    """
+    blocks = [(f"codes:{col}", codes[col]) for col in LABEL_COLUMNS]
+    blocks += [(f"prices:{col}", prices[col]) for col in PRICE_COLUMNS]
+    for col in KEY_COLUMNS:
+        postings, starts = build_postings(codes[col], len(labels[col]))
+        blocks += [(f"postings:{col}", postings), (f"starts:{col}", starts)]
+    offsets, offset = {}, 0
+    for name, values in blocks:
+        offsets[name] = [offset, values.typecode, len(values)]
+        offset = _align(offset + len(values) * values.itemsize)
+    header = json.dumps({"size": len(codes["State"]), "labels": labels, "blocks": offsets},
+                        ensure_ascii=False).encode("utf-8")
+    data_start = _align(8 + len(header))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, values in blocks:
+            f.seek(data_start + offsets[name][0])
+            values.tofile(f)
+    # Several workers may build the same snapshot; whichever lands last is identical
+    tmp_path.replace(path)
+
+
+def map_snapshot(path: Path) -> Tuple[Dict, Dict[str, memoryview]]:
+    """Memory-map a snapshot read-only; returns its header and a zero-copy view per block."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (header_length,) = struct.unpack_from("<Q", mapped, 0)
+    header = json.loads(bytes(mapped[8:8 + header_length]).decode("utf-8"))
+    data_start = _align(8 + header_length)
+    view = memoryview(mapped)
+    blocks = {}
+    for name, (offset, typecode, count) in header["blocks"].items():
+        start = data_start + offset
+        blocks[name] = view[start:start + count * array(typecode).itemsize].cast(typecode)
+    return header, blocks
+
+
+def _collect_snapshots(current: Path):
+    cutoff = time.time() - SNAPSHOT_GRACE_SECONDS
+    for path in current.parent.glob("*.bin"):
+        try:
+            if path != current and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+class MarketSnapshot:
+    """
+    One loaded version of the price table: columns, per-label row lists and alias lookups.
+
+    Never modified once built; a reload builds a new snapshot, so a query
+    that holds one sees labels, codes and prices from the same version.
+    """
+
+    def __init__(self, header: Dict, blocks: Dict[str, memoryview], signature=None):
+        self.labels: Dict[str, List[str]] = header["labels"]
+        self.codes = {col: blocks[f"codes:{col}"] for col in LABEL_COLUMNS}
+        self.prices = {col: blocks[f"prices:{col}"] for col in PRICE_COLUMNS}
+        self.size = header["size"]
+        self.signature = signature
+
+        self.indexes: Dict[str, Dict[str, List[memoryview]]] = {}
+        for col in KEY_COLUMNS:
+            postings, starts = blocks[f"postings:{col}"], blocks[f"starts:{col}"]
+            index: Dict[str, List[memoryview]] = {}
+            for code, label in enumerate(self.labels[col]):
+                # Labels differing only in case share a key, hence a list of row slices
+                index.setdefault(label.lower(), []).append(postings[starts[code]:starts[code + 1]])
+            self.indexes[col] = index
+
+        self._alias_patterns: Dict[str, re.Pattern] = {}
+        self._alias_targets: Dict[str, Dict[str, List[str]]] = {}
+        for col in KEY_COLUMNS:
+            targets: Dict[str, List[str]] = {}
+            for label in self.labels[col]:
+                for alias in _aliases(label):
+                    targets.setdefault(alias, []).append(label.lower())
+            # Longest first so "green gram" wins over "gram"
+            alternation = "|".join(re.escape(a) for a in sorted(targets, key=len, reverse=True))
+            self._alias_patterns[col] = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+            self._alias_targets[col] = targets
+
+    def row(self, row_id: int) -> Dict:
+        record = {col: self.labels[col][self.codes[col][row_id]] for col in LABEL_COLUMNS}
+        for col in PRICE_COLUMNS:
+            record[col] = self.prices[col][row_id]
+        return record
+
+    def _row_ids(self, column: str, values: Iterable[str]) -> set:
+        ids = set()
+        for value in values:
+            for rows in self.indexes[column].get(value.lower(), ()):
+                ids.update(rows)
+        return ids
+
+    def find(self, state=None, district=None, market=None, commodity=None) -> List[int]:
+        """
+        Return row ids matching every given filter.
+
+        Each filter is a label or a list of labels (case-insensitive); labels within
+        one filter are OR-ed, different filters are AND-ed.
+        """
+        selected = None
+        for column, value in zip(KEY_COLUMNS, (state, district, market, commodity)):
+            if not value:
+                continue
+            values = [value] if isinstance(value, str) else value
+            ids = self._row_ids(column, values)
+            selected = ids if selected is None else selected & ids
+            if not selected:
+                return []
+        if selected is None:
+            return []
+        return sorted(selected)
+
+    def lookup(self, state=None, district=None, market=None, commodity=None) -> List[Dict]:
+        return [self.row(i) for i in self.find(state, district, market, commodity)]
+
+    def mentions(self, text: str) -> Dict[str, List[str]]:
+        """Return the states, districts, markets and commodities named in the text."""
+        text = text.lower()
+        found = {}
+        for col in KEY_COLUMNS:
+            labels = set()
+            for alias in self._alias_patterns[col].findall(text):
+                labels.update(self._alias_targets[col][alias])
+            if labels:
+                found[col] = sorted(labels)
+        return found
+
+    def rows_for_question(self, question: str, user_profile: Optional[dict] = None,
+                          limit: int = MAX_PROMPT_ROWS) -> List[Dict]:
+        """Pick the rows relevant to a question, narrowed by the user's location."""
+        found = self.mentions(question)
+        if not found:
+            return []
+        # Place names are often both a district and a market ("Alappuzha"), so match either
+        filters = []
+        if "State" in found:
+            filters.append(self._row_ids("State", found["State"]))
+        if "Commodity" in found:
+            filters.append(self._row_ids("Commodity", found["Commodity"]))
+        if "District" in found or "Market" in found:
+            filters.append(self._row_ids("District", found.get("District", ()))
+                           | self._row_ids("Market", found.get("Market", ())))
+        ids = sorted(set.intersection(*filters))
+
+        # A bare commodity question is answered for the user's own district or state
+        if ids and "Commodity" in found and len(found) == 1 and isinstance(user_profile, dict):
+            for col in ("district", "state"):
+                place = user_profile.get(col)
+                if place:
+                    local = self.find(commodity=found["Commodity"], **{col: place})
+                    if local:
+                        ids = local
+                        break
+        return [self.row(i) for i in ids[:limit]]
+
+
+class MarketStore:
+    """
+    Columnar, indexed snapshot of market_price.csv.
+
+    The columns and per-label row lists live in a binary snapshot file that
+    is memory-mapped read-only, so worker processes share one copy through
+    the page cache; each worker only builds the small label lookups.
+
+    Queries run against the current MarketSnapshot; a reload replaces it
+    as a whole, so a query never mixes two versions of the table.
+    """
+
+    def __init__(self, path: Path = MARKET_FILE):
+        self.path = Path(path)
+        self.snapshot: Optional[MarketSnapshot] = None
+        self.load()
+
+    @property
+    def signature(self):
+        return self.snapshot.signature
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def snapshot_path(self, signature) -> Path:
+        digest = hashlib.sha1(f"{SNAPSHOT_FORMAT}|{self.path.resolve()}|{signature}".encode("utf-8")).hexdigest()
+        return SNAPSHOT_DIR / f"{self.path.stem}-{digest[:16]}.bin"
+
+    def _open_snapshot(self, signature):
+        """Header and block views of the snapshot for this CSV version, writing it first if needed."""
+        path = self.snapshot_path(signature)
+        if not path.exists():
+            labels, codes, prices = parse_csv(self.path)
+            try:
+                write_snapshot(path, labels, codes, prices)
+                _collect_snapshots(path)
+            except OSError as e:
+                # Read-only deployment: serve from this process's own arrays
+                logger.warning("Could not write market snapshot %s: %s", path, e)
+                blocks = {f"codes:{col}": memoryview(codes[col]) for col in LABEL_COLUMNS}
+                blocks.update({f"prices:{col}": memoryview(prices[col]) for col in PRICE_COLUMNS})
+                for col in KEY_COLUMNS:
+                    postings, starts = build_postings(codes[col], len(labels[col]))
+                    blocks[f"postings:{col}"], blocks[f"starts:{col}"] = memoryview(postings), memoryview(starts)
+                return {"size": len(codes["State"]), "labels": labels}, blocks
+        return map_snapshot(path)
+
+    def load(self):
+        """(Re)load the CSV's columns and rebuild the label lookups."""
+        signature = self._file_signature()
+        header, blocks = self._open_snapshot(signature)
+        # A single assignment, so concurrent readers see either the old snapshot or the new one
+        self.snapshot = MarketSnapshot(header, blocks, signature)
+
+    def is_stale(self) -> bool:
+        try:
+            return self._file_signature() != self.snapshot.signature
+        except OSError:
+            return False
+
+    def row(self, row_id: int) -> Dict:
+        return self.snapshot.row(row_id)
+
+    def find(self, state=None, district=None, market=None, commodity=None) -> List[int]:
+        return self.snapshot.find(state, district, market, commodity)
+
+    def lookup(self, state=None, district=None, market=None, commodity=None) -> List[Dict]:
+        return self.snapshot.lookup(state, district, market, commodity)
+
+    def mentions(self, text: str) -> Dict[str, List[str]]:
+        return self.snapshot.mentions(text)
+
+    def rows_for_question(self, question: str, user_profile: Optional[dict] = None,
+                          limit: int = MAX_PROMPT_ROWS) -> List[Dict]:
+        return self.snapshot.rows_for_question(question, user_profile, limit)
+
+
+def format_rows(rows: List[Dict]) -> str:
+    """Render rows as compact CSV for the prompt."""
+    if not rows:
+        return ""
+    columns = LABEL_COLUMNS + PRICE_COLUMNS
+    lines = [",".join(columns)]
+    for row in rows:
+        lines.append(",".join(f"{row[c]:g}" if c in PRICE_COLUMNS else row[c] for c in columns))
+    return "\n".join(lines)
+
+
+_store: Optional[MarketStore] = None
+_store_lock = threading.Lock()
+
+
+def get_market_store() -> MarketStore:
+    """Return the shared market store, reloading it when the CSV changes on disk."""
+    global _store
+    store = _store
+    if store is not None and not store.is_stale():
+        return store
+    with _store_lock:
+        if _store is None:
+            _store = MarketStore()
+        elif _store.is_stale():
+            _store.load()
+        return _store
+
+
+def market_context(question: str, user_profile: Optional[dict] = None) -> str:
+    """Return prompt-ready market rows relevant to the question."""
+    return format_rows(get_market_store().rows_for_question(question, user_profile))
@@ -0,0 +1,389 @@
+"""
+Daily market price history: date-partitioned snapshots with precomputed trends.
+
+    python market_history.py ingest market_price.csv --date 2026-10-17
+    python market_history.py aggregate
+    python market_history.py trend Onion --state Kerala
+
+Each ingested day is one columnar snapshot file (the market.py layout),
+never rewritten once written. After every ingest the 7- and 30-day
+aggregates per commodity and region are recomputed from the last 30 days of
+partitions only, so queries and updates cost the same however much history
+has accumulated.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from knowledge_base import normalize_state
+from market import BASE_DIR, LABEL_COLUMNS, MARKET_FILE, get_market_store, map_snapshot, parse_csv, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# One snapshot per day, under a directory per month: 2026-10/2026-10-17.bin
+HISTORY_DIR = Path(os.getenv("MARKET_HISTORY_DIR", BASE_DIR / "market_history"))
+AGGREGATES_FILE = Path(os.getenv("MARKET_AGGREGATES_FILE", BASE_DIR / ".cache" / "market" / "aggregates.json"))
+# Bumped whenever the aggregates layout changes
+AGGREGATES_FORMAT = 1
+
+# Trailing windows, in days, the aggregates are computed over
+WINDOWS = (7, 30)
+# Price moves smaller than this (in %) are reported as flat
+FLAT_PERCENT = float(os.getenv("MARKET_TREND_FLAT_PERCENT", "2"))
+# Most trend rows that get pasted into a prompt for one question
+MAX_TREND_ROWS = 20
+
+# Region levels the aggregates are kept at, and the columns naming a region
+LEVELS = {
+    "market": ["State", "District", "Market"],
+    "district": ["State", "District"],
+    "state": ["State"],
+}
+REGION_FIELDS = ["state", "district", "market"]
+
+
+def partition_path(day: date, history_dir: Path = HISTORY_DIR) -> Path:
+    return history_dir / day.strftime("%Y-%m") / f"{day.isoformat()}.bin"
+
+
+def partitions(history_dir: Path = HISTORY_DIR) -> List[Tuple[date, Path]]:
+    """Every ingested day and its snapshot file, oldest first."""
+    found = []
+    for path in history_dir.glob("*/*.bin"):
+        try:
+            found.append((date.fromisoformat(path.stem), path))
+        except ValueError:
+            logger.warning("Ignoring unexpected file in market history: %s", path)
+    return sorted(found)
+
+
+def ingest(csv_path: Path, day: date, history_dir: Path = HISTORY_DIR) -> Path:
+    """
+    Store a day's price snapshot as a new partition and refresh the aggregates.
+
+    Args:
+        csv_path (Path): A CSV with the market_price.csv columns
+        day (date): The day the prices were recorded
+
+    Raises:
+        FileExistsError: The day is already stored; partitions are never rewritten
+    """
+    path = partition_path(day, history_dir)
+    if path.exists():
+        raise FileExistsError(f"market prices for {day.isoformat()} are already stored in {path}")
+    labels, codes, prices = parse_csv(Path(csv_path))
+    write_snapshot(path, labels, codes, prices)
+    logger.info("Stored %d market rows for %s", len(codes["State"]), day.isoformat())
+    build_aggregates(history_dir)
+    return path
+
+
+def _daily_points(header: Dict, blocks: Dict) -> Dict[Tuple, List[float]]:
+    """Per (level, region, commodity): [modal sum, modal count, lowest min, highest max] for one day."""
+    labels = header["labels"]
+    columns = {col: blocks[f"codes:{col}"] for col in LABEL_COLUMNS}
+    low, high, modal = blocks["prices:Min Price"], blocks["prices:Max Price"], blocks["prices:Modal Price"]
+    points: Dict[Tuple, List[float]] = {}
+    for row_id in range(header["size"]):
+        if math.isnan(modal[row_id]):
+            continue
+        names = {col: labels[col][columns[col][row_id]] for col in LEVELS["market"] + ["Commodity"]}
+        for level, region_columns in LEVELS.items():
+            key = (level, tuple(names[col] for col in region_columns), names["Commodity"])
+            point = points.get(key)
+            if point is None:
+                point = points[key] = [0.0, 0, math.inf, -math.inf]
+            point[0] += modal[row_id]
+            point[1] += 1
+            if not math.isnan(low[row_id]):
+                point[2] = min(point[2], low[row_id])
+            if not math.isnan(high[row_id]):
+                point[3] = max(point[3], high[row_id])
+    return points
+
+
+def _change(points: List[Tuple[date, float, float, float]]) -> Optional[float]:
+    if len(points) < 2 or not points[0][1]:
+        return None
+    return round((points[-1][1] - points[0][1]) / points[0][1] * 100, 1)
+
+
+def direction(change: Optional[float]) -> Optional[str]:
+    """"up", "down" or "flat" for a % change; None when there is nothing to compare."""
+    if change is None:
+        return None
+    if abs(change) < FLAT_PERCENT:
+        return "flat"
+    return "up" if change > 0 else "down"
+
+
+def summarize(points: List[Tuple[date, float, float, float]], as_of: date) -> Dict:
+    """
+    Aggregate one commodity's daily (date, modal, min, max) points in one region.
+
+    Windows end at as_of, the newest day in the history, so a region that
+    stopped reporting shows no recent figures rather than old ones.
+    """
+    latest_day, latest_modal = points[-1][0], points[-1][1]
+    summary = {"latest_date": latest_day.isoformat(), "latest_modal": round(latest_modal, 2)}
+    for window in WINDOWS:
+        recent = [p for p in points if (as_of - p[0]).days < window]
+        summary[f"avg_{window}d"] = round(sum(p[1] for p in recent) / len(recent), 2) if recent else None
+        lows = [p[2] for p in recent if p[2] != math.inf]
+        highs = [p[3] for p in recent if p[3] != -math.inf]
+        summary[f"min_{window}d"] = min(lows) if lows else None
+        summary[f"max_{window}d"] = max(highs) if highs else None
+        summary[f"change_{window}d_pct"] = _change(recent)
+        summary[f"days_{window}d"] = len(recent)
+    summary["trend"] = direction(summary["change_7d_pct"] if summary["change_7d_pct"] is not None
+                                 else summary["change_30d_pct"])
+    return summary
+
+
+def compute_aggregates(history_dir: Path = HISTORY_DIR) -> Dict:
+    """Aggregates over the last max(WINDOWS) days of partitions, ready to be written as JSON."""
+    stored = partitions(history_dir)
+    if not stored:
+        return {"format": AGGREGATES_FORMAT, "as_of": None, "partitions": [], "rows": []}
+    as_of = stored[-1][0]
+    first = as_of - timedelta(days=max(WINDOWS) - 1)
+    window = [(day, path) for day, path in stored if day >= first]
+
+    series: Dict[Tuple, List[Tuple[date, float, float, float]]] = {}
+    for day, path in window:
+        header, blocks = map_snapshot(path)
+        for key, (total, count, low, high) in _daily_points(header, blocks).items():
+            series.setdefault(key, []).append((day, total / count, low, high))
+
+    rows = []
+    for (level, region, commodity), points in sorted(series.items()):
+        row = {"level": level, "commodity": commodity}
+        row.update(zip(REGION_FIELDS, region))
+        row.update(summarize(points, as_of))
+        rows.append(row)
+    return {
+        "format": AGGREGATES_FORMAT,
+        "as_of": as_of.isoformat(),
+        "partitions": [day.isoformat() for day, _ in window],
+        "rows": rows,
+    }
+
+
+def build_aggregates(history_dir: Path = HISTORY_DIR, path: Path = AGGREGATES_FILE) -> Dict:
+    """Recompute the aggregates and replace the aggregates file."""
+    aggregates = compute_aggregates(history_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aggregates, f, ensure_ascii=False)
+    # Readers never see a half-written file
+    tmp_path.replace(path)
+    logger.info("Market aggregates as of %s: %d rows", aggregates["as_of"], len(aggregates["rows"]))
+    return aggregates
+
+
+def _matches(value: str, wanted, field: str = "") -> bool:
+    if not wanted:
+        return True
+    wanted = [wanted] if isinstance(wanted, str) else wanted
+    # States are written "Tamil Nadu" in the price data and "tamilnadu" or "TamilNadu" by callers
+    key = normalize_state if field == "state" else str.lower
+    return key(value) in {key(w) for w in wanted}
+
+
+class MarketHistory:
+    """
+    Query side of the price history: the precomputed trends, and daily series.
+
+    Args:
+        history_dir (Path): Where the daily partitions are
+        aggregates_path (Path): The aggregates file; rebuilt if missing or outdated
+    """
+
+    def __init__(self, history_dir: Path = HISTORY_DIR, aggregates_path: Path = AGGREGATES_FILE):
+        self.history_dir = Path(history_dir)
+        self.aggregates_path = Path(aggregates_path)
+        self.as_of: Optional[str] = None
+        self.by_commodity: Dict[Tuple[str, str], List[Dict]] = {}
+        self.signature = None
+        self.load()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.aggregates_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self) -> Dict:
+        stored = partitions(self.history_dir)
+        try:
+            with open(self.aggregates_path, encoding="utf-8") as f:
+                aggregates = json.load(f)
+        except (OSError, ValueError):
+            aggregates = None
+        newest = stored[-1][0].isoformat() if stored else None
+        if aggregates is None or aggregates.get("format") != AGGREGATES_FORMAT or aggregates.get("as_of") != newest:
+            if not stored:
+                return {"as_of": None, "rows": []}
+            aggregates = build_aggregates(self.history_dir, self.aggregates_path)
+        return aggregates
+
+    def load(self):
+        """(Re)load the aggregates, rebuilding them first if they are missing or outdated."""
+        aggregates = self._read()
+        by_commodity: Dict[Tuple[str, str], List[Dict]] = {}
+        for row in aggregates["rows"]:
+            by_commodity.setdefault((row["level"], row["commodity"].lower()), []).append(row)
+        # Swap in at once so concurrent readers never see a half-built index
+        self.by_commodity, self.as_of = by_commodity, aggregates["as_of"]
+        self.signature = self._file_signature()
+
+    def is_stale(self) -> bool:
+        return self._file_signature() != self.signature
+
+    def trends(self, commodity, state=None, district=None, market=None) -> List[Dict]:
+        """
+        Aggregates for a commodity at the finest region level the filters name.
+
+        Each filter is a label or a list of labels (case-insensitive; states
+        also ignore spaces and punctuation). With no place given, one row per
+        state is returned.
+        """
+        level = "market" if market else "district" if district else "state"
+        commodities = [commodity] if isinstance(commodity, str) else commodity
+        rows = []
+        for name in commodities:
+            for row in self.by_commodity.get((level, name.lower()), ()):
+                if all(_matches(row.get(field) or "", wanted, field)
+                       for field, wanted in zip(REGION_FIELDS, (state, district, market))):
+                    rows.append(row)
+        return rows
+
+    def series(self, commodity: str, state=None, district=None, market=None,
+               days: int = max(WINDOWS)) -> List[Tuple[str, float]]:
+        """Daily average modal price of a commodity over the last days stored, oldest first."""
+        stored = partitions(self.history_dir)
+        if not stored:
+            return []
+        first = stored[-1][0] - timedelta(days=days - 1)
+        points = []
+        for day, path in stored:
+            if day < first:
+                continue
+            header, blocks = map_snapshot(path)
+            labels = header["labels"]
+            modal = blocks["prices:Modal Price"]
+            postings, starts = blocks["postings:Commodity"], blocks["starts:Commodity"]
+            total, count = 0.0, 0
+            for code, label in enumerate(labels["Commodity"]):
+                if label.lower() != commodity.lower():
+                    continue
+                for row_id in postings[starts[code]:starts[code + 1]]:
+                    place = [labels[col][blocks[f"codes:{col}"][row_id]] for col in LEVELS["market"]]
+                    if all(_matches(value, wanted, field)
+                           for value, wanted, field in zip(place, (state, district, market), REGION_FIELDS)) \
+                            and not math.isnan(modal[row_id]):
+                        total += modal[row_id]
+                        count += 1
+            if count:
+                points.append((day.isoformat(), round(total / count, 2)))
+        return points
+
+
+def format_trends(rows: List[Dict]) -> str:
+    """Render trend rows as compact CSV for the prompt."""
+    if not rows:
+        return ""
+    columns = ["commodity", "region", "latest_date", "latest_modal", "avg_7d", "avg_30d",
+               "min_30d", "max_30d", "change_7d_pct", "change_30d_pct", "trend"]
+    lines = [",".join(columns)]
+    for row in rows:
+        region = "/".join(row[field] for field in REGION_FIELDS if row.get(field))
+        values = [row["commodity"], region] + [row.get(c) for c in columns[2:]]
+        lines.append(",".join("" if v is None else f"{v:g}" if isinstance(v, float) else str(v) for v in values))
+    return "\n".join(lines)
+
+
+_history: Optional[MarketHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_market_history() -> MarketHistory:
+    """Return the shared price history, reloading it when the aggregates are rebuilt."""
+    global _history
+    history = _history
+    if history is not None and not history.is_stale():
+        return history
+    with _history_lock:
+        if _history is None:
+            _history = MarketHistory()
+        elif _history.is_stale():
+            _history.load()
+        return _history
+
+
+def find_trends(commodities: List[str], places: Iterable[Dict]) -> List[Dict]:
+    """Trends for the first of the candidate places (filter kwargs) that has history, else per state."""
+    history = get_market_history()
+    for place in places:
+        rows = history.trends(commodities, **place)
+        if rows:
+            return rows
+    return history.trends(commodities)
+
+
+def trend_context(question: str, user_profile: Optional[dict] = None) -> str:
+    """Return prompt-ready price trends for the commodities named in the question."""
+    found = get_market_store().mentions(question)
+    if "Commodity" not in found:
+        return ""
+    # The place named in the question wins, then the user's own district and state
+    places = []
+    for col, field in (("Market", "market"), ("District", "district"), ("State", "state")):
+        if col in found:
+            places.append({field: found[col]})
+    if isinstance(user_profile, dict):
+        for field in ("district", "state"):
+            if user_profile.get(field):
+                places.append({field: user_profile[field]})
+    return format_trends(find_trends(found["Commodity"], places)[:MAX_TREND_ROWS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily market price history and trends.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = sub.add_parser("ingest", help="Store one day's price CSV")
+    ingest_parser.add_argument("csv", nargs="?", default=str(MARKET_FILE), help="Price CSV (default: market_price.csv)")
+    ingest_parser.add_argument("--date", default=date.today().isoformat(), help="Day of the prices, YYYY-MM-DD")
+
+    sub.add_parser("aggregate", help="Recompute the trend aggregates")
+
+    trend = sub.add_parser("trend", help="Show the trend of a commodity")
+    trend.add_argument("commodity")
+    trend.add_argument("--state")
+    trend.add_argument("--district")
+    trend.add_argument("--market")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.command == "ingest":
+        print(ingest(Path(args.csv), date.fromisoformat(args.date)))
+    elif args.command == "aggregate":
+        aggregates = build_aggregates()
+        print(f"{len(aggregates['rows'])} rows as of {aggregates['as_of']}")
+    else:
+        rows = get_market_history().trends(args.commodity, args.state, args.district, args.market)
+        print(format_trends(rows) or f"No price history for {args.commodity}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,84 @@
 import os
-import google.generativeai as genai
-from pathlib import Path
+import threading
 from dotenv import load_dotenv
 from mcp.gtts_demo import detect_language, text_to_speech
+from answer_cache import get_answer_cache, corpus_version
+from retrieval import format_chunks, get_index
+from gemini_client import call_gemini, generative_model, request_options
 
 
 # Load environment variables
 load_dotenv()
 
-# Get API key from environment variable
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("Please set GOOGLE_API_KEY environment variable")
-
-# Configure the API
-genai.configure(api_key=GOOGLE_API_KEY)
-
 def initialize_model():
     """Initialize and return the Gemini model."""
-    return genai.GenerativeModel('gemini-2.0-flash')
+    return generative_model()
 
-def load_context_files():
-    """Load all combined text files from state_schemes directory."""
-    context = ""
-    base_path = Path("state_schemes")
-    
-    states = ["andhra-pradesh", "karnataka", "kerala", "tamilnadu", "telangana", "central"]
-    
-    for state in states:
-        combined_file = base_path / state / f"{state}_combined.txt"
-        if combined_file.exists():
-            with open(combined_file, 'r', encoding='utf-8') as f:
-                context += f"\n\n=== {state.upper()} SCHEMES ===\n"
-                context += f.read()
-    
-    return context
+SYSTEM_PROMPT = """You are a helpful assistant that provides information about various government schemes from different states in India. 
+    Use the context given with each question and your knowledge to answer questions about these schemes. 
+    """
 
-def create_chatbot():
-    """Create and return a chat instance with context."""
-    model = initialize_model()
-    context = load_context_files()
-    
-    chat = model.start_chat(history=[])
-    
-    system_prompt = f"""You are a helpful assistant that provides information about various government schemes from different states in India. 
-    Use the following context and your knowledge to answer questions about these schemes. 
-    
-    Context:
-    {context}
+def create_chatbot(model=None):
+    """Create and return a chat instance primed with the system prompt."""
+    model = model or generative_model(SYSTEM_PROMPT)
+    return model.start_chat(history=[])
+
+class ChatPool:
     """
-    
-    chat.send_message(system_prompt)
-    return chat
+    Reusable primed chats, so a tool call costs one LLM round-trip instead of two.
+
+    The system prompt is set once on the model; each call borrows a chat,
+    asks the question with the scheme chunks retrieved for it, and hands the
+    chat back with its history reset. The pool is rebuilt when the corpus
+    version changes.
+    """
+
+    def __init__(self, size: int = 4):
+        self.size = size
+        self._lock = threading.Lock()
+        self._build()
+
+    def _build(self):
+        self.version = corpus_version()
+        self.model = generative_model(SYSTEM_PROMPT)
+        self._idle = [create_chatbot(self.model) for _ in range(self.size)]
+
+    def acquire(self):
+        with self._lock:
+            if corpus_version() != self.version:
+                self._build()
+            if self._idle:
+                return self._idle.pop(), self.version
+            return create_chatbot(self.model), self.version
+
+    def release(self, chat, version):
+        chat.history = []
+        with self._lock:
+            # Chats from before a refresh are dropped rather than reused
+            if version == self.version and len(self._idle) < self.size:
+                self._idle.append(chat)
+
+    def ask(self, question: str) -> str:
+        chat, version = self.acquire()
+        try:
+            context = format_chunks(get_index().search(question))
+            response = call_gemini(chat.send_message, f"Context:\n{context}\n\nQuestion: {question}",
+                                   request_options=request_options())
+            return response.text
+        finally:
+            self.release(chat, version)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_chat_pool() -> ChatPool:
+    """Return the shared chat pool; MCP_CHAT_POOL_SIZE sets its size."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ChatPool(size=int(os.getenv("MCP_CHAT_POOL_SIZE", "4")))
+    return _pool
 
 def get_scheme_info(question: str) -> str:
     """
@@ -64,9 +91,13 @@ def get_scheme_info(question: str) -> str:
         str: The response from the chatbot
     """
     try:
-        chat = create_chatbot()
-        response = chat.send_message(question)
-        return response.text
+        version = corpus_version()
+        cached = get_answer_cache().get(question, version=version, scope="mcp-gemini")
+        if cached is not None:
+            return cached
+        answer = get_chat_pool().ask(question)
+        get_answer_cache().put(question, answer, version=version, scope="mcp-gemini")
+        return answer
     except Exception as e:
         return f"Error: {str(e)}"
 
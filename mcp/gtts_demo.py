@@ -1,42 +1,32 @@
 import argparse
-from gtts import gTTS
 import os
-from langdetect import detect
+import io
+from tts_cache import get_tts_cache
+from language import LANGUAGE_MAP, detect_language
 
-# Language mappings for gTTS
-LANGUAGE_MAP = {
-    "en": {"name": "English", "gtts": "en-in"},
-    "hi": {"name": "Hindi", "gtts": "hi"},
-    "te": {"name": "Telugu", "gtts": "te"},
-    "kn": {"name": "Kannada", "gtts": "kn"},
-    "bn": {"name": "Bengali", "gtts": "bn"},
-    "gu": {"name": "Gujarati", "gtts": "gu"},
-    "ml": {"name": "Malayalam", "gtts": "ml"},
-    "mr": {"name": "Marathi", "gtts": "mr"},
-    "ta": {"name": "Tamil", "gtts": "ta"},
-    "ur": {"name": "Urdu", "gtts": "ur"}
-}
+# Run gTTS and return the MP3 bytes
+def gtts_bytes(text, lang_code):
+    from gtts import gTTS
 
-# Detect language of text
-def detect_language(text):
-    try:
-        lang = detect(text)
-        return lang if lang in LANGUAGE_MAP else "en"
-    except:
-        return "en"
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang_code).write_to_fp(buffer)
+    return buffer.getvalue()
 
 # Convert text to speech
 def text_to_speech(text, language=None, output_file="output.mp3"):
-    # Detect language if not specified
-    lang_code = LANGUAGE_MAP[language]["gtts"] if language in LANGUAGE_MAP else LANGUAGE_MAP[detect_language(text)]["gtts"]
-    lang_name = LANGUAGE_MAP.get(language, LANGUAGE_MAP[detect_language(text)])["name"]
+    # Detect language (once) if not specified
+    if language not in LANGUAGE_MAP:
+        language = detect_language(text)
+    lang_code = LANGUAGE_MAP[language]["gtts"]
+    lang_name = LANGUAGE_MAP[language]["name"]
     print(f"Converting text to speech in {lang_name}...")
     
-    # Create gTTS object
-    tts = gTTS(text=text, lang=lang_code)
+    # Reuse audio for text that has been spoken before
+    audio = get_tts_cache().get_or_synthesize(text, lang_code, gtts_bytes)
     
     # Save to file
-    tts.save(output_file)
+    with open(output_file, "wb") as f:
+        f.write(audio)
     
     # Play the audio using afplay (macOS)
     print(f"Playing audio: {output_file}")
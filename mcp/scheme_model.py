@@ -1,67 +1,71 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
-from google import genai
 from pathlib import Path
+from retrieval import get_index, format_chunks
+from answer_cache import get_answer_cache, corpus_version
+from context_cache import ContextCache
+from gemini_client import call_gemini, get_client
 
 class SchemeModel:
     def __init__(self):
         # Load environment variables
         load_dotenv()
         
-        # Get API key from environment variable
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("Please set GOOGLE_API_KEY environment variable")
-            
-        # Initialize the client
-        self.client = genai.Client(api_key=self.api_key)
-        self.context = self._load_context_files()
+        # The process-wide client (raises if GOOGLE_API_KEY is not set), so HTTP connections are reused
+        self.client = get_client()
         self.system_prompt = self._create_system_prompt()
+        # The corpus is registered once per state and reused as a cached prompt prefix
+        self.context_cache = ContextCache(
+            self.client, self.system_prompt, ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+        )
     
-    def _load_context_files(self) -> str:
-        """Load all combined text files from state_schemes directory."""
-        context = ""
-        base_path = Path("state_schemes")
-        
-        states = ["andhra-pradesh", "karnataka", "kerala", "tamilnadu", "telangana", "central"]
-        
-        for state in states:
-            combined_file = base_path / state / f"{state}_combined.txt"
-            if combined_file.exists():
-                with open(combined_file, 'r', encoding='utf-8') as f:
-                    context += f"\n\n=== {state.upper()} SCHEMES ===\n"
-                    context += f.read()
-        
-        return context
-    
+    @property
+    def index(self):
+        # Looked up per call, so a refreshed corpus is picked up without a restart
+        return get_index()
+
     def _create_system_prompt(self) -> str:
-        """Create the system prompt with context."""
-        return f"""You are a helpful assistant that provides information about various government schemes from different states in India. 
+        """Create the system prompt; scheme context is retrieved per question."""
+        return """You are a helpful assistant that provides information about various government schemes from different states in India. 
         Use the following context to answer questions about these schemes. If you don't know something, say so.
-        
-        Context:
-        {self.context}
         """
     
-    def generate_response(self, question: str) -> str:
+    def _retrieve_context(self, question: str, state: Optional[str] = None) -> str:
+        """Return the scheme chunks most relevant to the question."""
+        return format_chunks(self.index.search(question, state=state))
+    
+    def generate_response(self, question: str, state: Optional[str] = None) -> str:
         """
         Generate a response for the given question.
         
         Args:
             question (str): The question about government schemes
+            state (str): Optional state to restrict the retrieved context to
             
         Returns:
             str: The generated response
         """
         try:
-            # Combine system prompt and question
-            full_prompt = f"{self.system_prompt}\n\nQuestion: {question}"
+            version = corpus_version()
+            cached = get_answer_cache().get(question, {"state": state}, version, scope="scheme-model")
+            if cached is not None:
+                return cached
             
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=full_prompt
-            )
-            return response.text
+            # Only the question is sent on top of the cached corpus prefix
+            answer = self.context_cache.ask(question, state)
+            if answer is None:
+                # Combine system prompt and retrieved context with the question
+                context = self._retrieve_context(question, state)
+                full_prompt = f"{self.system_prompt}\nContext:\n{context}\n\nQuestion: {question}"
+                
+                response = call_gemini(
+                    self.client.models.generate_content,
+                    model="gemini-2.0-flash",
+                    contents=full_prompt
+                )
+                answer = response.text
+            get_answer_cache().put(question, answer, {"state": state}, version, scope="scheme-model")
+            return answer
         except Exception as e:
             return f"Error: {str(e)}" 
\ No newline at end of file
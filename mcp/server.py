@@ -1,6 +1,15 @@
 from fastmcp import FastMCP
-from mcp.gemini import initialize_model, load_context_files, get_scheme_info
+from mcp.gemini import get_chat_pool, get_scheme_info
+from retrieval import get_index
+from knowledge_base import start_watcher
+from market import get_market_store
+from market_history import format_trends, get_market_history
+from answer_cache import normalize_question
+from pipeline import SingleFlight
+from lifecycle import Warmup
+import asyncio
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -9,33 +18,89 @@ logger = logging.getLogger(__name__)
 # Initialize FastMCP
 mcp = FastMCP(name="govt-schemes", stateless_http=True)
 
-# Load context and model once at startup
-logger.info("Loading context files...")
-context = load_context_files()
-logger.info("Initializing model...")
-model = initialize_model()
+# Build the scheme index and the primed chat pool in the background; the first call waits if needed
+logger.info("Warming up chat pool...")
+warmup = Warmup({"knowledge_base": get_index, "corpus_watcher": start_watcher, "chat_pool": get_chat_pool,
+                 "market_history": get_market_history})
+warmup.start()
+
+# LLM-backed tool calls run in threads, at most this many at a time; the rest wait their turn
+MAX_CONCURRENT_CALLS = int(os.getenv("MCP_MAX_CONCURRENCY", os.getenv("MCP_CHAT_POOL_SIZE", "4")))
+llm_slots = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+# Identical questions asked while one is being answered share that answer
+inflight = SingleFlight()
+
+async def ask(question: str) -> str:
+    """Answer a question with the LLM, coalescing identical in-flight questions."""
+    async def run():
+        async with llm_slots:
+            return await asyncio.to_thread(get_scheme_info, question)
+    return await inflight.do(normalize_question(question), run)
+
+def format_scheme_list(schemes) -> str:
+    lines = []
+    for scheme in schemes:
+        line = f"- {scheme['name']}"
+        if scheme.get("benefit_amount"):
+            line += f" (benefit: {scheme['benefit_amount']})"
+        lines.append(line)
+    return "\n".join(lines)
+
+def format_scheme_details(scheme) -> str:
+    parts = [scheme["name"], f"State: {scheme['state'].title()}"]
+    if scheme.get("benefit_amount"):
+        parts.append(f"Benefit: {scheme['benefit_amount']}")
+    if scheme.get("eligibility"):
+        parts.append(f"Eligibility:\n{scheme['eligibility']}")
+    if scheme.get("registration"):
+        parts.append(f"How to apply:\n{scheme['registration']}")
+    parts.append(f"Details:\n{scheme['body']}")
+    return "\n\n".join(parts)
 
 @mcp.tool()
-def get_scheme_information(question: str) -> str:
+async def get_scheme_information(question: str) -> str:
     """Get information about government schemes based on the question."""
-    return get_scheme_info(question)
+    return await ask(question)
 
+@mcp.tool()
+async def get_state_schemes(state: str) -> str:
+    """Get all schemes available in a specific state."""
+    # Listed straight from the knowledge base; the LLM is only asked for states it does not cover
+    # get_index() may be loading or rebuilding shards; keep that off the event loop
+    schemes = await asyncio.to_thread(lambda: get_index().schemes(state))
+    if schemes:
+        return f"Schemes available in {state}:\n{format_scheme_list(schemes)}"
+    return await ask(f"What are all the schemes available in {state}?")
 
+@mcp.tool()
+async def get_scheme_details(scheme_name: str, state: str = None) -> str:
+    """Get detailed information about a specific scheme."""
+    scheme = await asyncio.to_thread(lambda: get_index().find_scheme(scheme_name, state))
+    if scheme is not None:
+        return format_scheme_details(scheme)
+    question = f"Tell me about the {scheme_name}"
+    if state:
+        question += f" in {state}"
+    return await ask(question)
 
-# @mcp.tool()
-# def get_state_schemes(state: str) -> str:
-#     """Get all schemes available in a specific state."""
-#     question = f"What are all the schemes available in {state}?"
-#     return get_scheme_info(question)
+def price_trend(commodity: str, state: str = None, district: str = None, market: str = None) -> str:
+    """Trend rows for a commodity as text; loads the price table and history on first use."""
+    # "moong" or "paddy" resolve to the commodity labels used in the price data
+    commodities = get_market_store().mentions(commodity).get("Commodity") or [commodity]
+    history = get_market_history()
+    rows = history.trends(commodities, state, district, market)
+    if not rows:
+        return f"No price history for {commodity}."
+    lines = [f"Price trend for {commodity} as of {history.as_of}:"]
+    lines.append(format_trends(rows))
+    return "\n".join(lines)
 
-# @mcp.tool()
-# def get_scheme_details(scheme_name: str, state: str = None) -> str:
-#     """Get detailed information about a specific scheme."""
-#     question = f"Tell me about the {scheme_name}"
-#     if state:
-#         question += f" in {state}"
-#     return get_scheme_info(question)
+@mcp.tool()
+async def get_market_price_trend(commodity: str, state: str = None, district: str = None, market: str = None) -> str:
+    """Get how a commodity's market price has moved: latest modal price, 7/30-day averages, range and % change."""
+    # Loading the price table or rebuilding the aggregates must not block the event loop
+    return await asyncio.to_thread(price_trend, commodity, state, district, market)
 
 if __name__ == "__main__":
     print("🚀 Government Schemes Assistant is running!")
-    mcp.run(transport="sse", host="127.0.0.1", port=9000)
\ No newline at end of file
+    mcp.run(transport="sse", host="127.0.0.1", port=9000)
@@ -1,22 +1,17 @@
-from google.generativeai import GenerativeModel, configure
-import google.generativeai as genai
+from pathlib import Path
 from dotenv import load_dotenv
 import os
-load_dotenv
+from stt_backends import get_stt_backend
+from gemini_client import configure
+load_dotenv()
 # Configure the API key
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+configure()
 
-# Upload the file
-myfile = genai.upload_file(path="output.mp3")
+# Read the audio file
+audio = Path("output.mp3").read_bytes()
 
-# Create the model instance
-model = genai.GenerativeModel("gemini-2.0-flash")
-
-# Prompt
-prompt = 'Generate a transcript of the speech.'
-
-# Generate content
-response = model.generate_content([prompt, myfile])
+# Transcribe with the configured backend (STT_BACKEND=gemini or whisper)
+text = get_stt_backend().transcribe(audio, "audio/mpeg")
 
 # Print the transcript
-print(response.text)
+print(text)
@@ -0,0 +1,226 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("govt_scheme.requests")
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 128000)
+
+_current: "contextvars.ContextVar[Optional[RequestTrace]]" = contextvars.ContextVar("request_trace", default=None)
+
+
+def _label_text(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _label_text(self.labels + ("le",), key + (f"{bound:g}",))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labels + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {counts[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {counts[-2]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {counts[-1]:g}")
+        return lines
+
+
+REQUESTS = Counter("voice_requests_total", "Voice requests by pipeline mode and outcome.", ["mode", "status"])
+REQUEST_SECONDS = Histogram("voice_request_duration_seconds", "End-to-end voice request latency.",
+                            LATENCY_BUCKETS, ["mode"])
+STAGE_SECONDS = Histogram("voice_stage_duration_seconds", "Latency of one pipeline stage.",
+                          LATENCY_BUCKETS, ["stage"])
+PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Prompt tokens per LLM call.", TOKEN_BUCKETS)
+TOKENS = Counter("llm_tokens_total", "LLM tokens by kind (prompt, cached, output).", ["kind"])
+
+# name -> (help text, callable returning the current value)
+_gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+
+def register_gauge(name: str, help_text: str, read: Callable[[], float]):
+    """Expose a value that is read when /metrics is scraped, e.g. a cache hit ratio."""
+    _gauges[name] = (help_text, read)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, PROMPT_TOKENS, TOKENS):
+        lines.extend(metric.render())
+    for name, (help_text, read) in sorted(_gauges.items()):
+        try:
+            value = float(read())
+        except Exception:
+            continue
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value:g}"])
+    return "\n".join(lines) + "\n"
+
+
+def log_event(event: str, **fields):
+    """Write one JSON log line tagged with the current request id."""
+    trace = _current.get()
+    record = {"ts": round(time.time(), 3), "event": event}
+    if trace is not None:
+        record["request_id"] = trace.request_id
+    record.update(fields)
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class RequestTrace:
+    """
+    Timing spans and attributes of one request.
+
+    Stages record into the trace that is active in their context, including
+    stages run on the pipeline's worker threads.
+
+    Args:
+        mode (str): Pipeline mode, used as a metric label
+        request_id (str): Id echoed in logs and the X-Request-Id header
+    """
+
+    def __init__(self, mode: str, request_id: Optional[str] = None):
+        self.mode = mode
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.attributes: Dict[str, object] = {}
+        self.finished = False
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add_span(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def server_timing(self) -> str:
+        """Server-Timing header value with every stage and the total so far."""
+        parts = [f"{stage};dur={seconds * 1000:.0f}" for stage, seconds in self.spans]
+        parts.append(f"total;dur={self.elapsed * 1000:.0f}")
+        return ", ".join(parts)
+
+    def finish(self, status: str = "ok"):
+        """Record the request's metrics and log its summary; later calls do nothing."""
+        if self.finished:
+            return
+        self.finished = True
+        elapsed = self.elapsed
+        REQUESTS.inc(mode=self.mode, status=status)
+        REQUEST_SECONDS.observe(elapsed, mode=self.mode)
+        stages: Dict[str, float] = {}
+        for stage, seconds in self.spans:
+            stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+        with self.activate():
+            log_event("request", mode=self.mode, status=status, seconds=round(elapsed, 4),
+                      stages=stages, **self.attributes)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Attach attributes (e.g. where the answer came from) to the current request's log line."""
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration measured elsewhere for the current request."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one pipeline stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def record_usage(response):
+    """Count the tokens reported in a Gemini response's usage metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_token_count", 0) or 0
+    cached = getattr(usage, "cached_content_token_count", 0) or 0
+    output = getattr(usage, "candidates_token_count", 0) or 0
+    PROMPT_TOKENS.observe(prompt)
+    TOKENS.inc(prompt, kind="prompt")
+    TOKENS.inc(cached, kind="cached")
+    TOKENS.inc(output, kind="output")
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes["prompt_tokens"] = trace.attributes.get("prompt_tokens", 0) + prompt
@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional
+
+
+class Overloaded(Exception):
+    """Raised when the server is already handling its maximum number of requests."""
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage takes longer than its timeout."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    The first caller for a key starts the work; callers arriving while it
+    is in flight await the same result instead of repeating it.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        # Forget the key when the work finishes, even if every caller was cancelled
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+class Pipeline:
+    """
+    Runs blocking pipeline stages (STT, LLM, TTS) on a bounded worker pool.
+
+    Args:
+        max_concurrency (int): Requests allowed in flight; extra requests are
+            rejected with Overloaded instead of queueing behind slow ones
+        max_workers (int): Threads available to blocking stages
+        timeouts (Dict[str, float]): Per-stage timeouts in seconds
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_workers: Optional[int] = None,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.max_concurrency = max_concurrency
+        self.timeouts = timeouts or {}
+        # Each request runs one stage at a time, so this many threads never queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max_concurrency,
+                                           thread_name_prefix="pipeline")
+        self.active = 0
+        # mode -> [requests, total seconds], to compare pipeline variants
+        self.latency: Dict[str, list] = {}
+
+    def acquire(self):
+        """Reserve a request slot or raise Overloaded; pair with release()."""
+        if self.active >= self.max_concurrency:
+            raise Overloaded(f"{self.active} requests already in flight")
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a request slot for the duration of the block."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs):
+        """
+        Run a blocking function on the worker pool with the stage's timeout.
+
+        A timed-out call cannot be interrupted; its thread finishes in the
+        background while the request fails fast with StageTimeout.
+        """
+        loop = asyncio.get_running_loop()
+        # Like asyncio.to_thread, carry context variables (e.g. the request trace) into the worker
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args, **kwargs))
+        timeout = self.timeouts.get(stage)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeout(stage, timeout)
+
+    async def iterate(self, stage: str, iterator: Iterator):
+        """Yield items from a blocking iterator, fetching each one on the pool."""
+        done = object()
+        while True:
+            item = await self.run(stage, next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def observe(self, mode: str, seconds: float):
+        """Record how long one request took end to end in the given mode."""
+        totals = self.latency.setdefault(mode, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def latency_stats(self) -> Dict[str, Dict]:
+        return {
+            mode: {"requests": count, "avg_seconds": total / count if count else 0.0}
+            for mode, (count, total) in self.latency.items()
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,44 @@
+import os
+from typing import Dict, List, Optional
+
+from eligibility import excluded_scheme_ids
+from knowledge_base import KnowledgeBase, get_knowledge_base, normalize_state
+
+# Below this BM25 score the best chunk is a poor match, and an overview of the schemes is added
+MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "3"))
+
+
+def get_index() -> KnowledgeBase:
+    """Return the scheme search index: the per-state sharded knowledge base."""
+    return get_knowledge_base()
+
+
+def format_chunks(chunks: List[Dict]) -> str:
+    """Render retrieved chunks as prompt context."""
+    return "\n\n".join(
+        f"=== {chunk['state'].upper()} | {chunk['title']} ===\n{chunk['text']}" for chunk in chunks
+    )
+
+
+def retrieve_context(question: str, state: Optional[str] = None, k: int = 5,
+                     user_profile: Optional[dict] = None) -> str:
+    """
+    Return prompt-ready context relevant to the question and the user's state.
+
+    With a profile, chunks of schemes the profile is ruled out of are dropped,
+    so the prompt only carries schemes the user may be eligible for. When
+    no chunk matches well, the state's and central scheme names are added.
+    """
+    index = get_index()
+    if not isinstance(user_profile, dict):
+        chunks = index.search(question, state=state, k=k)
+    else:
+        excluded = excluded_scheme_ids(index, user_profile, index.search_states(state))
+        chunks = [
+            chunk for chunk in index.search(question, state=state, k=k * 3)
+            if chunk["scheme_id"] not in excluded.get(chunk["state"], ())
+        ][:k]
+    if not chunks or chunks[0]["score"] < MIN_SCORE:
+        # Usually a question in words the corpus does not use; the LLM can still pick from the list
+        chunks += index.overview(state)
+    return format_chunks(chunks)
@@ -0,0 +1,244 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from shared_store import SharedStore
+
+# Rough characters-per-token ratio, good enough to keep history under a budget
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _content_text(content) -> str:
+    """Concatenate the text parts of a chat history entry."""
+    parts = content.get("parts", []) if isinstance(content, dict) else getattr(content, "parts", [])
+    texts = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict):
+            texts.append(part.get("text", ""))
+        else:
+            texts.append(getattr(part, "text", "") or "")
+    return "".join(texts)
+
+
+def _history_record(history) -> list:
+    """Chat history as plain role/text entries that can be stored and restored."""
+    records = []
+    for content in history:
+        role = content.get("role") if isinstance(content, dict) else getattr(content, "role", None)
+        records.append({"role": role or "user", "parts": [_content_text(content)]})
+    return records
+
+
+class Session:
+    """One user's chat plus bookkeeping for eviction."""
+
+    def __init__(self, session_id: str, chat: Any, user_profile: Optional[dict] = None):
+        self.session_id = session_id
+        self.chat = chat
+        self.user_profile = user_profile
+        # Revision of the shared record this chat reflects, when sessions are shared
+        self.revision: Optional[str] = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.lock = threading.Lock()
+
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(_content_text(c)) for c in self.chat.history)
+
+    def trim_history(self, max_tokens: int):
+        """Drop the oldest question/answer pairs until the history fits the budget."""
+        history = list(self.chat.history)
+        total = sum(estimate_tokens(_content_text(c)) for c in history)
+        dropped = 0
+        while total > max_tokens and len(history) - dropped > 2:
+            total -= sum(estimate_tokens(_content_text(c)) for c in history[dropped:dropped + 2])
+            dropped += 2
+        if dropped:
+            self.chat.history = history[dropped:]
+
+
+class SessionManager:
+    """
+    Keeps one chat per session id with LRU and idle-time eviction.
+
+    Args:
+        chat_factory (Callable): Builds a new chat for a session; receives the
+            user profile so the system prompt is set once per session
+        max_sessions (int): Most sessions kept in memory before the least
+            recently used one is evicted
+        ttl_seconds (float): Sessions idle for longer than this are evicted
+        max_history_tokens (int): History budget per session
+        on_response (Callable): Called with each model response, e.g. to
+            count the tokens in its usage metadata
+        call (Callable): Runs each chat.send_message as call(fn, *args, **kwargs),
+            e.g. to add retries and rate limiting; defaults to a plain call
+        store (SharedStore): If set, each session's profile and history are
+            saved there after every turn, and a worker whose copy is out of
+            date rebuilds the chat from it, so a user's requests can land on
+            any worker. Concurrent turns of one session on two workers are
+            last-write-wins.
+    """
+
+    def __init__(self, chat_factory: Callable[[Optional[dict]], Any], max_sessions: int = 1000,
+                 ttl_seconds: float = 1800, max_history_tokens: int = 8000,
+                 on_response: Optional[Callable[[Any], None]] = None,
+                 call: Optional[Callable[..., Any]] = None, store: Optional[SharedStore] = None):
+        self.chat_factory = chat_factory
+        self.on_response = on_response
+        self.call = call or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_history_tokens = max_history_tokens
+        self.store = store
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_expired(self, now: float):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+
+    def _load(self, session_id: str) -> Optional[Dict]:
+        data = self.store.get(f"session:{session_id}") if self.store is not None else None
+        return json.loads(data) if data else None
+
+    def _save(self, session: Session):
+        if self.store is None:
+            return
+        session.revision = uuid.uuid4().hex
+        record = {"revision": session.revision, "profile": session.user_profile,
+                  "history": _history_record(session.chat.history)}
+        self.store.set(f"session:{session.session_id}", json.dumps(record, ensure_ascii=False).encode("utf-8"),
+                       self.ttl_seconds)
+
+    def get(self, session_id: str, user_profile: Optional[dict] = None) -> Session:
+        """Return the session for this id, creating it (or restoring it from the store) if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = now
+        record = self._load(session_id)
+        if session is not None and (record is None or record["revision"] == session.revision):
+            return session
+
+        # Build the chat outside the lock; the factory may be slow
+        if record is not None:
+            profile = record.get("profile") or user_profile
+            session = Session(session_id, self.chat_factory(profile), profile)
+            session.chat.history = record["history"]
+            session.revision = record["revision"]
+        else:
+            session = Session(session_id, self.chat_factory(user_profile), user_profile)
+        with self._lock:
+            existing = self._sessions.get(session_id)
+            if existing is not None and existing.revision == session.revision:
+                return existing
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def has_history(self, session_id: str, user_profile: Optional[dict] = None) -> bool:
+        """True once the session has turns, i.e. its next answer may depend on the conversation."""
+        return bool(self.get(session_id, user_profile).chat.history)
+
+    def drop(self, session_id: str):
+        # A shared record is kept: it still holds the last complete turn
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def send(self, session_id: str, message: Any, user_profile: Optional[dict] = None,
+             history_message: Any = None, **send_kwargs) -> str:
+        """
+        Send a message in the session's chat and return the reply text.
+
+        Args:
+            session_id (str): The session key
+            message: The full message for this turn, e.g. question plus retrieved context
+            user_profile (dict): Used only when the session has to be created
+            history_message: What to keep in history for this turn instead of
+                the full message, so per-turn context does not pile up; either a
+                string, or a callable that maps the reply text to the
+                (user, model) texts to keep
+            send_kwargs: Passed on to chat.send_message, e.g. generation_config
+
+        Returns:
+            str: The model's reply
+        """
+        session = self.get(session_id, user_profile)
+        with session.lock:
+            response = self.call(session.chat.send_message, message, **send_kwargs)
+            self._finish_turn(session, history_message, response.text)
+        if self.on_response is not None:
+            self.on_response(response)
+        return response.text
+
+    def stream(self, session_id: str, message: str, user_profile: Optional[dict] = None,
+               history_message: Optional[str] = None, **send_kwargs) -> Iterator[str]:
+        """
+        Like send, but yields the reply text piece by piece as the model streams it.
+
+        If the caller stops iterating early the session is dropped, since the
+        chat is left holding a half-received reply.
+        """
+        session = self.get(session_id, user_profile)
+        with session.lock:
+            completed = False
+            try:
+                # Only opening the stream is retried; a reply cut off midway is not
+                response = self.call(session.chat.send_message, message, stream=True, **send_kwargs)
+                for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+                completed = True
+                if self.on_response is not None:
+                    self.on_response(response)
+            finally:
+                if completed:
+                    self._finish_turn(session, history_message)
+                else:
+                    self.drop(session_id)
+
+    def record(self, session_id: str, question: str, answer: str, user_profile: Optional[dict] = None):
+        """Add a turn answered elsewhere (e.g. from a cache) to the session history."""
+        session = self.get(session_id, user_profile)
+        with session.lock:
+            session.chat.history = list(session.chat.history) + [
+                {"role": "user", "parts": [question]},
+                {"role": "model", "parts": [answer]},
+            ]
+            session.trim_history(self.max_history_tokens)
+            session.last_used = time.monotonic()
+            self._save(session)
+
+    def _finish_turn(self, session: Session, history_message: Any, reply: Optional[str] = None):
+        if callable(history_message):
+            user_text, model_text = history_message(reply)
+            history = list(session.chat.history)
+            history[-2:] = [{"role": "user", "parts": [user_text]}, {"role": "model", "parts": [model_text]}]
+            session.chat.history = history
+        elif history_message is not None:
+            history = list(session.chat.history)
+            history[-2] = {"role": "user", "parts": [history_message]}
+            session.chat.history = history
+        session.trim_history(self.max_history_tokens)
+        session.last_used = time.monotonic()
+        self._save(session)
@@ -0,0 +1,149 @@
+import abc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStore(abc.ABC):
+    """
+    Byte-valued key/value store the caches and sessions can keep their data in.
+
+    A store is "shared" when every worker process sees the same data; only
+    then do the caches layer it under their own in-process copy.
+    """
+
+    shared = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """The value stored under key, or None if it is missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        """Store value under key, expiring after ttl_seconds if given."""
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        """Remove key if it is stored."""
+
+
+class MemoryStore(SharedStore):
+    """
+    In-process store with LRU eviction and per-key expiry; the single-worker default.
+
+    Args:
+        max_entries (int): Least recently used keys are evicted past this
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisStore(SharedStore):
+    """
+    Store backed by Redis or any server speaking its protocol (Valkey, KeyDB, ...).
+
+    Errors talking to the server are logged and treated as misses, so a
+    store outage slows requests down instead of failing them.
+
+    Args:
+        url (str): e.g. redis://localhost:6379/0
+        prefix (str): Prepended to every key, so several deployments can share a server
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "govt-schemes:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=float(os.getenv("SHARED_STORE_TIMEOUT", "0.5")))
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning("Shared store read failed: %s", e)
+            return None
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        try:
+            self.client.set(self.prefix + key, value, px=int(ttl_seconds * 1000) if ttl_seconds else None)
+        except Exception as e:
+            logger.warning("Shared store write failed: %s", e)
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning("Shared store delete failed: %s", e)
+
+
+def create_shared_store(url: Optional[str] = None) -> SharedStore:
+    """
+    Build the store selected by SHARED_STORE_URL.
+
+    Unset or memory:// keeps everything in the process. redis:// (or
+    rediss://, unix://) uses a Redis-compatible server shared by all
+    workers; if the redis package is not installed the in-process store is
+    used instead.
+    """
+    url = url if url is not None else os.getenv("SHARED_STORE_URL", "")
+    if not url or url.startswith("memory://"):
+        return MemoryStore()
+    try:
+        return RedisStore(url, prefix=os.getenv("SHARED_STORE_PREFIX", "govt-schemes:"))
+    except ImportError:
+        logger.warning("redis is not installed; caches and sessions stay in each worker")
+        return MemoryStore()
+
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> SharedStore:
+    """Return the process-wide store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_shared_store()
+    return _store
+
+
+def worker_shared_store() -> Optional[SharedStore]:
+    """The process-wide store if worker processes share it, else None (local state is enough)."""
+    store = get_shared_store()
+    return store if store.shared else None
@@ -0,0 +1,41 @@
+import re
+from typing import Callable, Iterable, Iterator
+
+# Sentence ends: Latin punctuation, Devanagari danda/double danda, or a line break
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?।॥])\s+|\n+")
+
+# Very short fragments ("1.", "Rs.") are held back and spoken with the next sentence
+MIN_SENTENCE_CHARS = 20
+
+
+def iter_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """Regroup streamed text chunks into whole sentences as soon as each one ends."""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        pieces = _SENTENCE_END_RE.split(buffer)
+        # The last piece may still be growing
+        buffer = pieces.pop()
+        pending = ""
+        for piece in pieces:
+            pending = f"{pending} {piece}".strip() if pending else piece.strip()
+            if len(pending) >= MIN_SENTENCE_CHARS:
+                yield pending
+                pending = ""
+        if pending:
+            buffer = f"{pending} {buffer}"
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def stream_speech(sentences: Iterable[str], synthesize: Callable[[str], bytes]) -> Iterator[bytes]:
+    """
+    Synthesize each sentence as it arrives and yield its MP3 bytes.
+
+    MP3 frames are self-contained, so the per-sentence clips can be sent back
+    to back as one audio stream.
+    """
+    for sentence in sentences:
+        audio = synthesize(sentence)
+        if audio:
+            yield audio
@@ -0,0 +1,189 @@
+import abc
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import google.generativeai as genai
+
+from gemini_client import call_gemini, generative_model, request_options
+
+logger = logging.getLogger(__name__)
+
+# Audio up to this size is sent inline with the STT request instead of via the Files API
+INLINE_AUDIO_LIMIT = 15 * 1024 * 1024
+
+STT_PROMPT = 'Generate a transcript of the speech.'
+
+
+class STTBackend(abc.ABC):
+    """Speech-to-text interface: audio bytes in, transcript out."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def transcribe(self, audio: bytes, mime_type: str = "audio/mpeg") -> str:
+        """Transcript of one clip."""
+
+    def transcribe_batch(self, items: Sequence[Tuple[bytes, str]]) -> List[str]:
+        return [self.transcribe(audio, mime_type) for audio, mime_type in items]
+
+
+class GeminiSTT(STTBackend):
+    """Transcribes with a Gemini model; clips under INLINE_AUDIO_LIMIT skip the upload."""
+
+    name = "gemini"
+
+    def __init__(self, model=None, model_name: str = 'gemini-2.0-flash'):
+        self.model = model or generative_model(model_name=model_name)
+
+    def transcribe(self, audio: bytes, mime_type: str = "audio/mpeg") -> str:
+        if len(audio) <= INLINE_AUDIO_LIMIT:
+            myfile = {"mime_type": mime_type, "data": audio}
+        else:
+            myfile = call_gemini(genai.upload_file, io.BytesIO(audio), mime_type=mime_type)
+        response = call_gemini(self.model.generate_content, [STT_PROMPT, myfile], request_options=request_options())
+        return response.text
+
+
+class WhisperSTT(STTBackend):
+    """
+    Local CPU transcription with faster-whisper, loaded once and kept warm.
+
+    faster-whisper has no multi-file batch call, so a batch is spread over
+    the model's worker replicas (num_workers) and decoded in parallel.
+
+    Args:
+        model_size (str): Whisper model name or path, e.g. "small"
+        compute_type (str): CTranslate2 compute type; int8 is fastest on CPU
+        num_workers (int): Model replicas, i.e. clips decoded at the same time
+    """
+
+    name = "whisper"
+
+    def __init__(self, model_size: str = "small", compute_type: str = "int8", num_workers: int = 2):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type, num_workers=num_workers)
+        self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="whisper")
+
+    def transcribe(self, audio: bytes, mime_type: str = "audio/mpeg") -> str:
+        segments, _ = self.model.transcribe(io.BytesIO(audio), beam_size=1, vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe_batch(self, items: Sequence[Tuple[bytes, str]]) -> List[str]:
+        return list(self.executor.map(lambda item: self.transcribe(*item), items))
+
+
+class BatchingSTT(STTBackend):
+    """
+    Collects concurrent requests for up to max_wait seconds and decodes them together.
+
+    Args:
+        backend (STTBackend): Does the actual decoding via transcribe_batch
+        max_batch (int): Most clips decoded in one batch
+        max_wait (float): How long the first request waits for company
+    """
+
+    def __init__(self, backend: STTBackend, max_batch: int = 4, max_wait: float = 0.05):
+        self.backend = backend
+        self.name = backend.name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[bytes, str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"stt-batch-{self.name}", daemon=True)
+        self._worker.start()
+
+    def transcribe(self, audio: bytes, mime_type: str = "audio/mpeg") -> str:
+        future: Future = Future()
+        self._queue.put((audio, mime_type, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                texts = self.backend.transcribe_batch([(audio, mime_type) for audio, mime_type, _ in batch])
+                for (_, _, future), text in zip(batch, texts):
+                    future.set_result(text)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+
+
+class FallbackSTT(STTBackend):
+    """Tries each backend in order; the next one is used if a backend fails or hears nothing."""
+
+    def __init__(self, backends: Sequence[STTBackend]):
+        self.backends = list(backends)
+        self.name = "+".join(b.name for b in self.backends)
+
+    def transcribe(self, audio: bytes, mime_type: str = "audio/mpeg") -> str:
+        error = None
+        for backend in self.backends:
+            try:
+                text = backend.transcribe(audio, mime_type)
+                if text and text.strip():
+                    return text
+            except Exception as e:
+                logger.warning("STT backend %s failed: %s", backend.name, e)
+                error = e
+        if error is not None:
+            raise error
+        return ""
+
+
+_backend: Optional[STTBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_stt_backend(kind: Optional[str] = None, gemini_model=None) -> STTBackend:
+    """
+    Build the STT backend selected by STT_BACKEND.
+
+    "gemini" (default) uses the Gemini model only. "whisper" decodes locally
+    with batching (WHISPER_MODEL, WHISPER_WORKERS, STT_BATCH_SIZE,
+    STT_BATCH_WAIT_MS) and falls back to Gemini; if faster-whisper is not
+    installed the Gemini backend is used on its own.
+    """
+    kind = (kind or os.getenv("STT_BACKEND", "gemini")).lower()
+    gemini = GeminiSTT(gemini_model)
+    if kind != "whisper":
+        return gemini
+    try:
+        local = WhisperSTT(
+            model_size=os.getenv("WHISPER_MODEL", "small"),
+            num_workers=int(os.getenv("WHISPER_WORKERS", "2")),
+        )
+    except ImportError:
+        logger.warning("faster-whisper is not installed; using Gemini for speech-to-text")
+        return gemini
+    batching = BatchingSTT(
+        local,
+        max_batch=int(os.getenv("STT_BATCH_SIZE", "4")),
+        max_wait=float(os.getenv("STT_BATCH_WAIT_MS", "50")) / 1000,
+    )
+    return FallbackSTT([batching, gemini])
+
+
+def get_stt_backend(gemini_model=None) -> STTBackend:
+    """Return the process-wide STT backend, loading the model on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_stt_backend(gemini_model=gemini_model)
+    return _backend
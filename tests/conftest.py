@@ -0,0 +1,15 @@
+import pytest
+
+import knowledge_base
+
+
+@pytest.fixture(scope="session")
+def kb(tmp_path_factory):
+    """The repo's corpus built into a temporary directory and installed as the process-wide knowledge base."""
+    kb_dir = tmp_path_factory.mktemp("kb")
+    knowledge_base.build(kb_dir)
+    index = knowledge_base.KnowledgeBase(kb_dir)
+    knowledge_base._kb, knowledge_base._next_check = index, float("inf")
+    yield index
+    index.close()
+    knowledge_base._kb = None
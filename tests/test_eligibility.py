@@ -0,0 +1,65 @@
+import pytest
+
+from eligibility import THRESHOLD_CRITERIA, check, eligible_schemes, excluded_scheme_ids, is_eligibility_question
+
+
+@pytest.mark.parametrize("question", [
+    "Which schemes am I eligible for?",
+    "What government schemes do I qualify for?",
+    "Am I eligible for any scheme?",
+    "Which government scheme am I eligible for?",
+    "What schemes are there for me?",
+    "मैं किन योजनाओं के लिए पात्र हूं?",
+    "मी कोणत्या योजनांसाठी पात्र आहे?",
+    "ನಾನು ಯಾವ ಯೋಜನೆಗಳಿಗೆ ಅರ್ಹ?",
+])
+def test_eligibility_questions(question):
+    assert is_eligibility_question(question)
+
+
+@pytest.mark.parametrize("question", [
+    "How do I apply for the PM Kisan scheme?",
+    "What documents do I need to apply for Rythu Bandhu scheme",
+    "Am I eligible for the 2BHK housing scheme?",
+    "Which schemes can I apply for?",
+    "How do I apply for the Telangana 2BHK housing scheme?",
+    "Am I eligible for PM Kisan yojana?",
+    "क्या मैं पीएम किसान योजना के लिए पात्र हूं?",
+    "What pension schemes are there for senior citizens in Andhra Pradesh?",
+    "What is the price of tomato in Kerala markets today?",
+])
+def test_not_eligibility_questions(question):
+    assert not is_eligibility_question(question)
+
+
+MALE_FARMER = {"state": "Bihar", "gender": "male", "occupation": "farmer", "age": 45}
+
+
+def test_central_schemes_without_eligibility_section_have_no_criteria(kb):
+    central = {s["name"]: s for s in kb.schemes("central")}
+    for name in ("Pradhanmantri Garib Kalyan Yojana (PMGKY)", "Operation Greens Mission – TOP Scheme"):
+        assert central[name]["criteria"] == {}, name
+
+
+def test_mentions_do_not_exclude_schemes(kb):
+    excluded = excluded_scheme_ids(kb, MALE_FARMER, kb.search_states("Bihar"))
+    names = {s["id"]: s["name"] for s in kb.schemes("central")}
+    assert not {names[i] for i in excluded["central"]}
+    # Keyword criteria ("women", "students") never remove a scheme from the context
+    for state in kb.search_states("Bihar"):
+        for scheme in kb.schemes(state):
+            if scheme["id"] in excluded[state]:
+                assert set(scheme["criteria"]) & set(THRESHOLD_CRITERIA)
+
+
+def test_threshold_criteria_exclude():
+    assert check({"age": 30}, {"min_age": 60})[0] is False
+    assert check({"age": 65}, {"min_age": 60})[0] is True
+
+
+def test_eligible_schemes_are_confirmed_and_unique(kb):
+    profile = {"state": "Karnataka", "gender": "female", "occupation": "weaver", "age": 35}
+    schemes = eligible_schemes(kb, profile, limit=50)
+    assert all(check(profile, s["criteria"])[0] is True for s in schemes)
+    names = [s["name"].lower() for s in schemes]
+    assert len(names) == len(set(names))
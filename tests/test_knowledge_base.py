@@ -0,0 +1,94 @@
+import os
+import re
+import time
+
+import pytest
+
+import knowledge_base
+from knowledge_base import parse_sources
+
+
+def test_one_record_per_central_scheme():
+    central = parse_sources([knowledge_base.STATE_DIR / "central_combined.txt"])["central"]
+    text = (knowledge_base.STATE_DIR / "central_combined.txt").read_text(encoding="utf-8")
+    # Entries start at "Launched: <date>" or, in part of the list, "Launched <date>"
+    assert len(central) == len(re.findall(r"^Launched[: ]", text, re.MULTILINE)) == 164
+    for scheme in central:
+        assert len(re.findall(r"^Launched[: ]", scheme["body"], re.MULTILINE)) == 1, scheme["name"]
+
+
+def test_central_records_are_not_merged():
+    central = {s["name"]: s for s in parse_sources()["central"]}
+    pm_kisan = central["Pradhan Mantri Kisan Samman Nidhi Yojana"]
+    assert "Swachh Survekshan" not in pm_kisan["body"]
+    assert pm_kisan["benefit_amount"] == "Rs. 6000"
+
+
+def test_benefit_amount_is_not_a_budget():
+    karnataka = {s["name"]: s for s in parse_sources()["karnataka"]}
+    # Both articles quote the scheme's crore-scale outlay, which is not a benefit
+    assert karnataka["Karnataka Yeshasvini Health Insurance Scheme"]["benefit_amount"] == ""
+    assert karnataka["Indira Canteens in Karnataka"]["benefit_amount"] == ""
+
+
+def test_repeated_articles_are_parsed_once():
+    for state, schemes in parse_sources().items():
+        keys = [knowledge_base.scheme_key(s["name"]) for s in schemes]
+        assert len(keys) == len(set(keys)), state
+
+
+@pytest.mark.parametrize("toc, expected", [
+    ("Telangana 2BHK Housing SchemeEligibility", ["Telangana 2BHK Housing Scheme", "Eligibility"]),
+    ("Karnataka Free Laptop Scheme 2020Karnataka Free Laptop Scheme Registration",
+     ["Karnataka Free Laptop Scheme 2020", "Karnataka Free Laptop Scheme Registration"]),
+    ("AP YSR Rythu Bharosa Application Form 2020 [Apply]AP YSR Rythu Bharosa Scheme",
+     ["AP YSR Rythu Bharosa Application Form 2020 [Apply]", "AP YSR Rythu Bharosa Scheme"]),
+    ("1. CMEGP Online Application Form2. Download CMEGP Application Form",
+     ["1. CMEGP Online Application Form", "2. Download CMEGP Application Form"]),
+])
+def test_toc_headings_are_split(toc, expected):
+    assert knowledge_base._toc_headings(["Table of Contents", toc]) == expected
+
+
+@pytest.mark.parametrize("name, state, expected", [
+    ("Swachh Survekshan", None, "Swachh Survekshan"),
+    ("Varishtha Pension Bima Yojana", "Karnataka", "Varishtha Pension Bima Yojana 2017"),
+    ("PM Kisan Samman Nidhi", "Bihar", "Pradhan Mantri Kisan Samman Nidhi Yojana"),
+])
+def test_find_scheme_by_name(kb, name, state, expected):
+    assert kb.find_scheme(name, state)["name"] == expected
+
+
+def test_find_scheme_rejects_unrelated_hits(kb):
+    # Shares words with many schemes but names none of them
+    assert kb.find_scheme("Made up Moon Scheme", "Kerala") is None
+
+
+def test_replaced_shard_outlives_the_grace_period_from_its_retirement(tmp_path, monkeypatch):
+    sources, kb_dir = tmp_path / "state", tmp_path / "kb"
+    sources.mkdir()
+    corpus = sources / "kerala_combined.txt"
+    corpus.write_text("Table of Contents\nKerala Pension Scheme\nDetails\nRs. 1600 per month.\n", encoding="utf-8")
+    monkeypatch.setattr(knowledge_base, "STATE_DIR", sources)
+    monkeypatch.setattr(knowledge_base, "CONTEXT_FILE", tmp_path / "missing.txt")
+    monkeypatch.setattr(knowledge_base, "STATE_SCHEMES_DIR", tmp_path / "missing")
+
+    old_file = knowledge_base.build(kb_dir)["states"]["kerala"]["file"]
+    # Built long ago: its age must not count towards the grace period
+    hour_ago = time.time() - 3600
+    os.utime(kb_dir / old_file, (hour_ago, hour_ago))
+    old = knowledge_base.KnowledgeBase(kb_dir)
+
+    corpus.write_text(corpus.read_text(encoding="utf-8") + "Kerala Housing Scheme\n", encoding="utf-8")
+    manifest = knowledge_base.build(kb_dir)
+    assert manifest["states"]["kerala"]["file"] != old_file
+    assert old_file in manifest["retired"]
+    # A reader still on the previous version can open the replaced shard
+    assert old.search("pension", state="kerala")
+
+    later = time.time() + knowledge_base.SHARD_GRACE_SECONDS + 1
+    monkeypatch.setattr(knowledge_base.time, "time", lambda: later)
+    manifest = knowledge_base.build(kb_dir)
+    assert not (kb_dir / old_file).exists()
+    assert old_file not in manifest["retired"]
+    assert knowledge_base.read_manifest(kb_dir)["retired"] == {}
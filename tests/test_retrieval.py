@@ -0,0 +1,42 @@
+import pytest
+
+from benchmark import SAMPLE_QUERIES
+from language import gloss_query
+from retrieval import retrieve_context
+
+RECORDED = {query["clip"]: query for query in SAMPLE_QUERIES if "clip" in query}
+
+
+def test_gloss_handles_inflected_words():
+    assert "farmer" in gloss_query("शेतकऱ्यांसाठी कोणत्या सरकारी योजना आहेत")
+    assert "samman nidhi" in gloss_query("प्रधानमंत्री किसान सम्मान निधि योजना में किसानों को")
+
+
+def test_hindi_pm_kisan_question_finds_the_central_record(kb):
+    query = RECORDED["WhatsApp Audio 2025-05-11 at 00.58.45.mp3"]
+    results = kb.search(query["transcript"], state=query["profile"]["state"])
+    assert any(r["state"] == "central" and "Kisan Samman Nidhi" in r["title"] for r in results)
+    assert "Kisan Samman Nidhi" in retrieve_context(query["transcript"], query["profile"]["state"],
+                                                    user_profile=query["profile"])
+
+
+def test_marathi_question_gets_context(kb):
+    context = retrieve_context("शेतकऱ्यांसाठी कोणत्या सरकारी योजना आहेत", "Maharashtra",
+                               user_profile={"state": "Maharashtra"})
+    assert "Kisan" in context
+
+
+def test_kannada_farmer_question_gets_farmer_schemes(kb):
+    query = RECORDED["kannada.mp3"]
+    results = kb.search(query["transcript"], state=query["profile"]["state"])
+    assert any("Kisan" in r["title"] or "Agricultur" in r["title"] for r in results)
+
+
+@pytest.mark.parametrize("query", SAMPLE_QUERIES, ids=lambda q: q["transcript"][:30])
+def test_every_sample_question_gets_context(kb, query):
+    assert retrieve_context(query["transcript"], query["profile"].get("state"), user_profile=query["profile"])
+
+
+def test_unmatched_question_falls_back_to_overview(kb):
+    context = retrieve_context("ಇದು ಏನು", "Karnataka")
+    assert "Schemes overview" in context
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from shared_store import SharedStore, worker_shared_store
+
+BASE_DIR = Path(__file__).resolve().parent
+CACHE_DIR = BASE_DIR / ".cache" / "tts"
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of the text for cache keys: NFC, collapsed whitespace."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(text: str, lang: str, fmt: Optional[str] = None) -> str:
+    # gTTS's own MP3 keeps the original key; re-encoded replies are cached per format
+    lang = f"{lang}\0{fmt}" if fmt else lang
+    return hashlib.sha256(f"{lang}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Content-addressed on-disk cache of synthesized speech with LRU eviction.
+
+    Clips are keyed by text and language, plus the reply format for audio
+    re-encoded from gTTS's MP3, so a repeated reply is never transcoded again.
+
+    Args:
+        cache_dir (Path): Where the audio files live, named <key>.<format>
+        max_bytes (int): Total size kept on disk; least recently used files go first
+        store (SharedStore): If set, clips are also written there and fetched
+            from there on a disk miss, for workers that do not share a disk
+        store_ttl_seconds (float): How long clips are kept in the store
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_bytes: int = 200 * 1024 * 1024,
+                 store: Optional[SharedStore] = None, store_ttl_seconds: float = 7 * 24 * 3600):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.store = store
+        self.store_ttl_seconds = store_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_entries()
+
+    @staticmethod
+    def _file_name(key: str, fmt: Optional[str]) -> str:
+        # gTTS's own output is MP3; re-encoded clips carry their format's extension
+        return f"{key}.{fmt or 'mp3'}"
+
+    def _path(self, name: str) -> Path:
+        return self.cache_dir / name[:2] / name
+
+    def _load_entries(self):
+        """Rebuild the LRU order from what is already on disk, oldest access first."""
+        if not self.cache_dir.exists():
+            return
+        files = []
+        for path in self.cache_dir.glob("*/*.*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Evicted by another worker sharing this directory since the listing
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def get(self, text: str, lang: str, fmt: Optional[str] = None) -> Optional[bytes]:
+        key = cache_key(text, lang, fmt)
+        name = self._file_name(key, fmt)
+        try:
+            data = self._path(name).read_bytes()
+        except OSError:
+            data = self.store.get(f"tts:{key}") if self.store is not None else None
+            if data is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            self._write(name, data)
+            with self._lock:
+                self.hits += 1
+            return data
+        with self._lock:
+            self.hits += 1
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                # Written by another worker sharing this directory
+                self._entries[name] = len(data)
+                self._total_bytes += len(data)
+                self._evict()
+        try:
+            # mtime doubles as last-access time so LRU order survives restarts
+            os.utime(self._path(name))
+        except OSError:
+            pass
+        return data
+
+    def put(self, text: str, lang: str, data: bytes, fmt: Optional[str] = None):
+        key = cache_key(text, lang, fmt)
+        self._write(self._file_name(key, fmt), data)
+        if self.store is not None:
+            self.store.set(f"tts:{key}", data, self.store_ttl_seconds)
+
+    def _write(self, name: str, data: bytes):
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(name).unlink()
+            except OSError:
+                pass
+
+    def get_or_synthesize(self, text: str, lang: str, synthesize: Callable[[str, str], bytes]) -> bytes:
+        """Return cached MP3 bytes, calling synthesize(text, lang) only on a miss."""
+        data = self.get(text, lang)
+        if data is None:
+            data = synthesize(text, lang)
+            self.put(text, lang, data)
+        return data
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache: Optional[TTSCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Return the process-wide TTS cache; TTS_CACHE_MAX_MB sets its size on disk."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                max_mb = float(os.getenv("TTS_CACHE_MAX_MB", "200"))
+                _cache = TTSCache(max_bytes=int(max_mb * 1024 * 1024), store=worker_shared_store())
+    return _cache